@@ -1,114 +1,483 @@
-from flask import Flask, request, send_file, render_template, send_from_directory, render_template_string, redirect, url_for
+from flask import Flask, request, send_file, render_template, render_template_string, redirect, url_for, jsonify, Response, g
+import logging
 import os
+import shutil
+import uuid
 import pandas as pd
 import re
-import pycountry
-from postcode_matcher import PostcodeMatcher
+import time
+from postcode_matcher import PostcodeMatcher, normalise_postcode
+from relocation import relocate_matches
+from jobs import JobQueue
+from parallel import cleanse_parallel
+from country_resolver import country_resolver
+from validators import validators
+from schema import SchemaResolver
+from pipeline import Pipeline, Stage, ALL_COLUMNS, merge_reports
+from result_cache import ResultCache, ruleset_version
+from streaming import save_upload, stream_file
+from preview_index import PreviewIndexes
+import file_formats
+from incremental import RowStore, row_keys, row_fingerprints
+import duplicates
+import compact
+import batch
+import tracing
+from metrics import Registry, CONTENT_TYPE
+from werkzeug.utils import safe_join
 
 app = Flask(__name__)
 
 UPLOAD_FOLDER = 'uploads'
 PROCESSED_FOLDER = 'processed'
+RESULT_CACHE_FOLDER = 'result_cache'
+# Disk space for cached results of repeated uploads; 0 turns the cache off
+RESULT_CACHE_MAX_BYTES = int(os.environ.get('RESULT_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+# Bump when a change to the cleanse code alters its output, so cached results are discarded
+CACHE_VERSION = 4
+# Rows per chunk when streaming a CSV through the cleanse; None loads the whole file at once
+CHUNK_SIZE = int(os.environ.get('CHUNK_SIZE', 0)) or None
+# Reuse the processed rows of the previous upload of a file, cleansing only new or changed rows
+INCREMENTAL = bool(int(os.environ.get('INCREMENTAL', 0)))
+# Hold text as categoricals (low-cardinality columns) and Arrow strings while cleansing, to use less memory
+MEMORY_OPTIMIZED = bool(int(os.environ.get('MEMORY_OPTIMIZED', 0)))
+# Link rows that look like the same customer across the whole file (adds the duplicate columns)
+DETECT_DUPLICATES = bool(int(os.environ.get('DETECT_DUPLICATES', 1)))
+# Chunked mode only detects duplicates when DETECT_DUPLICATES=1 is set explicitly: it loads the compared
+# columns of the whole file and rewrites the output, so CHUNK_SIZE no longer bounds peak memory
+DETECT_DUPLICATES_CHUNKED = bool(int(os.environ.get('DETECT_DUPLICATES', 0)))
+# Files cleansed at the same time by the background worker pool
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+# Unfinished jobs accepted before new submissions are refused; 0 for no limit
+MAX_PENDING_JOBS = int(os.environ.get('MAX_PENDING_JOBS', 0)) or None
+QUEUE_FULL_MESSAGE = 'Too many files are being processed, please try again later'
+# Seconds a finished job's status and result stay available from /jobs/<job_id>
+JOB_RESULT_TTL = int(os.environ.get('JOB_RESULT_TTL', 3600))
+# Worker processes sharing the rows of a single file; 1 cleanses on the calling process
+PARALLEL_WORKERS = int(os.environ.get('PARALLEL_WORKERS', 1))
+# Most the data files of one zip archive uploaded to /process_batch may expand to
+BATCH_MAX_BYTES = int(os.environ.get('BATCH_MAX_BYTES', 1024 * 1024 * 1024))
+# Rows per preview page, and the most a client may ask for at once
+PREVIEW_PAGE_SIZE = 100
+PREVIEW_MAX_PAGE_SIZE = 1000
 
 for folder in [UPLOAD_FOLDER, PROCESSED_FOLDER]:
     os.makedirs(folder, exist_ok=True)
-    
+
+# Structured logs (JSON lines on stderr, level from LOG_LEVEL) tagged with the request ID,
+# which the background jobs and parallel workers carry on with
+tracing.configure_logging()
+logger = logging.getLogger(__name__)
+
+# Metrics of this process, served at /metrics
+registry = Registry()
+request_seconds = registry.histogram('http_request_duration_seconds', 'Time taken to handle a request',
+                                     ['route', 'method', 'status'])
+bytes_received = registry.counter('http_request_bytes_total', 'Bytes of uploaded files received', ['route'])
+bytes_sent = registry.counter('http_response_bytes_total', 'Bytes of processed files sent', ['route'])
+queue_depth = registry.gauge('datacleanse_jobs_pending', 'Jobs queued or running on the worker pool',
+                             callback=lambda: jobs.pending_count())
+job_seconds = registry.histogram('datacleanse_job_duration_seconds', 'Time taken to cleanse a file')
+rows_total = registry.counter('datacleanse_rows_total', 'Rows cleansed')
+rows_per_second = registry.gauge('datacleanse_rows_per_second', 'Rows per second of the last cleansed file')
+stage_seconds = registry.histogram('datacleanse_stage_duration_seconds', 'Time taken by each cleanse stage of a file',
+                                   ['stage'])
+validation_errors = registry.counter('datacleanse_validation_errors_total', 'Values flagged as invalid', ['field'])
+memory_saved = registry.counter('datacleanse_memory_saved_bytes_total',
+                                'Memory saved by compacting loaded text (memory-optimized mode)')
+country_lookups = registry.counter('datacleanse_country_lookups_total',
+                                   'Distinct country values resolved, by whether the resolver cache had them',
+                                   ['result'])
+
+
+def record_job(result):
+    # Called as each background job finishes, with the dict run_cleanse returned
+    rows_total.inc(result['row_count'])
+    job_seconds.observe(result['seconds'])
+    if result['seconds']:
+        rows_per_second.set(result['row_count'] / result['seconds'])
+    for entry in result['timings']:
+        stage_seconds.observe(entry['seconds'], stage=entry['stage'])
+    for field, count in result['errors'].items():
+        validation_errors.inc(count, field=field)
+    if result['memory']:
+        memory_saved.inc(result['memory']['saved'])
+    # Resolution runs in the pool workers, so their cache counts come back with each job
+    country_lookups.inc(result['country_lookups']['hits'], result='hit')
+    country_lookups.inc(result['country_lookups']['misses'], result='miss')
+
+
 matcher = PostcodeMatcher()
+jobs = JobQueue(max_workers=JOB_WORKERS, max_pending=MAX_PENDING_JOBS, on_done=record_job,
+                result_ttl=JOB_RESULT_TTL)
+preview_indexes = PreviewIndexes()
 
 class DataCleanse:
     
-    def __init__(self, file_path):
-        self.process_file(file_path)
-        matcher = PostcodeMatcher()
-        
+    # Headers that identify each field's column, compared ignoring case, spaces and punctuation
+    # (so "Post_Code", "post code" and "POSTCODE" all match "postcode"). A header may identify
+    # more than one field; the first column in the file wins when several match a field.
+    COLUMN_ALIASES = {
+        "id": ["id", "usr_id", "user_id"],
+        "phone": ["phone", "phone number"],
+        "landline": ["landline"],
+        "postcode": ["postcode", "postal_code", "zip_code", "pc"],
+        "email": ["email", "email address"],
+        "street_address_1": ["street address 1"],
+        "street_address_2": ["street address 2"],
+        "parent": ["parent"],
+        "name": ["name"],
+        "site": ["site"],
+        "customer": ["customer"],
+        "country": ["country"],
+        # Name and address fields only duplicate detection compares on
+        "first_name": ["name", "first name"],
+        "surname": ["surname", "last name"],
+        "address": ["street address 1", "address"],
+    }
+
+    EMAIL_OUTPUTS = ["email", "Email Errors", "Additional Emails", "Additional Emails Errors",
+                     "Emails (Additional)", "Emails (Additional) Errors"]
+    ADDRESS_COLUMNS = ["street_address_1", "street_address_2"]
+    ERROR_COLUMNS = ["Postcode Errors", "Phone Errors", "Landline Errors", "Email Errors"]
+    # Columns stages assign new values into row by row, which a categorical would refuse;
+    # memory-optimized mode keeps them as strings
+    TEXT_COLUMNS = ["street_address_1", "street_address_2", "Emails (Additional)"]
+    DUPLICATE_COLUMNS = ["Duplicate Cluster", "Duplicate Score"]
+    # The field of COLUMN_ALIASES each field compared by duplicate detection is read from
+    DUPLICATE_FIELDS = {
+        "name": "first_name",
+        "surname": "surname",
+        "email": "email",
+        "phone": "phone",
+        "postcode": "postcode",
+        "address": "address",
+    }
+
+    # Stages in the order cleanse runs them. Relocating stages read every column and may also
+    # write any column they move values out of; process_all_rows records those as it goes.
+    # The second phone pass picks up numbers only made valid by later stages (e.g. the landline
+    # clean-up), so the pipeline re-runs it over just the columns written since the first pass.
+    PIPELINE = Pipeline([
+        Stage("process_id_col", ["id"], ["id"]),
+        Stage("process_phone", [ALL_COLUMNS], ["phone"]),
+        Stage("process_landline", [ALL_COLUMNS], ["landline"]),
+        Stage("process_postcode", [ALL_COLUMNS], ["postcode", "Postcode Errors"]),
+        Stage("process_email", [ALL_COLUMNS], EMAIL_OUTPUTS),
+        Stage("process_address", ADDRESS_COLUMNS, ADDRESS_COLUMNS),
+        Stage("process_phone", [ALL_COLUMNS], ["phone"]),
+        Stage("remove_parent_duplicates", ["parent", "name", "site", "customer"], ["parent"]),
+        Stage("convert_countries_to_iso", ["country"], ["country"]),
+        Stage("create_error_columns", [ALL_COLUMNS], ERROR_COLUMNS),
+        Stage("fill_blanks", [ALL_COLUMNS], []),
+    ])
+
+    def __init__(self, file_path=None, chunk_size=None, progress=None, workers=1, csv_options=None,
+                 input_format=None, output_format=None, incremental=False, memory_optimized=False):
+        # Where each field's column is in the frame being cleansed; resolved once per header layout
+        self.schema = None
+        # Optional callback(stage, stage_number, total_stages) called as each stage starts
+        self.progress = progress
+        self.workers = workers
+        # Extra pd.read_csv arguments for the input, e.g. the encoding and sep sniffed from an upload
+        self.csv_options = csv_options or {}
+        # Per-stage timings of the last run: dicts of stage, seconds, rows, memory_delta, columns, skipped
+        self.stage_report = []
+        # Columns process_all_rows moved values in or out of during the current stage
+        self.relocated_columns = set()
+        # Rows reused from and recomputed since the previous run, set by incremental processing
+        self.row_report = None
+        # Rows cleansed, and flagged values per field (e.g. "postcode" for the "Postcode Errors" column)
+        self.row_count = 0
+        self.error_counts = {}
+        # Country values the resolver's cache already had (hits) or had to look up (misses) during this run
+        self.country_lookups = {"hits": 0, "misses": 0}
+        # Whether text is compacted after loading, and the memory that saved (bytes before, after and saved)
+        self.memory_optimized = memory_optimized
+        self.memory_report = None
+        # Without a file the instance is only used to cleanse DataFrames passed to cleanse()
+        if file_path is None:
+            return
+        # Formats default to the input's extension; the output keeps the input's format unless told otherwise
+        self.input_format = file_formats.format_for_path(file_path, input_format)
+        self.output_format = file_formats.format_for_path(file_path, output_format or self.input_format)
+        self.output_path = file_formats.output_path(PROCESSED_FOLDER, file_path, self.output_format)
+        # Only CSV can be streamed through in chunks; other formats are read and written whole
+        if incremental:
+            self.process_file_incremental(file_path)
+        elif chunk_size and self.input_format == "csv" and self.output_format == "csv":
+            self.process_file_chunked(file_path, chunk_size)
+        else:
+            self.process_file(file_path)
+
     def process_file(self, file_path):
-        print("--- Processing : " + file_path)
-        file_data = pd.read_csv(file_path)
+        logger.info("Processing %s", file_path)
+        file_data = file_formats.read_frame(file_path, self.input_format, self.csv_options)
+        file_data = self.cleanse_rows(self.compact(self.normalise_file_data(file_data)))
+        self.count_errors(file_data)
+        self.mark_duplicates(file_data)
+        file_formats.write_frame(file_data, self.output_path, self.output_format)
+
+    def process_file_chunked(self, file_path, chunk_size):
+        logger.info("Processing %s in chunks of %d rows", file_path, chunk_size)
+        output_path = self.output_path
+        output_columns = None
+        # Read every cell as text so all chunks parse the same way, whichever rows they hold
+        with pd.read_csv(file_path, chunksize=chunk_size, dtype=str, **self.csv_options) as reader:
+            for file_data in reader:
+                file_data = self.cleanse(self.compact(self.normalise_file_data(file_data)))
+                self.count_errors(file_data)
+                if output_columns is None:
+                    # The first chunk fixes the output layout for the whole file
+                    output_columns = list(file_data.columns)
+                    file_data.to_csv(output_path, index=False, quoting=1)
+                else:
+                    file_data = file_data.reindex(columns=output_columns, fill_value="")
+                    file_data.to_csv(output_path, mode='a', header=False, index=False, quoting=1)
+        # Duplicates can span chunks, so they are found in a second pass over the written file (if asked for)
+        self.mark_duplicates_in_file(output_path, chunk_size)
+
+    def process_file_incremental(self, file_path):
+        logger.info("Processing %s incrementally", file_path)
+        # Cells are read as text, as in chunked mode, so a row cleanses the same whichever rows it arrives with
+        csv_options = dict(self.csv_options, dtype=str)
+        file_data = file_formats.read_frame(file_path, self.input_format, csv_options)
+        file_data = self.normalise_file_data(file_data)
+        header = list(file_data.columns)
+
+        id_col_name = self.schema.column("id")
+        if id_col_name is None:
+            # Without IDs rows can't be matched to the previous run, so every row is cleansed
+            logger.warning("ID Column Not Found, cleansing every row")
+            file_data = self.cleanse_rows(self.compact(file_data))
+            self.count_errors(file_data)
+            self.mark_duplicates(file_data)
+            file_formats.write_frame(file_data, self.output_path, self.output_format)
+            self.row_report = {"reused": 0, "recomputed": len(file_data)}
+            return
+
+        keys = row_keys(file_data[id_col_name])
+        fingerprints = row_fingerprints(file_data)
+        # Compacted only after fingerprinting, so fingerprints don't depend on the mode
+        file_data = self.compact(file_data)
+        store = RowStore(f"{self.output_path}.rows", RULESET_VERSION)
+        store.load(header)
+        positions = store.lookup(keys, fingerprints)
+        reused = positions >= 0
+
+        # Cleanse only the new and changed rows, then put the reused ones back in file order
+        # A copy, as the stages write into it in place
+        changed_data = file_data[~reused].copy()
+        # A file without rows is still cleansed, so its output has the same columns as in the other modes
+        if len(changed_data) or not len(file_data):
+            changed_data = self.cleanse_rows(changed_data)
+        reused_data = store.rows.iloc[positions[reused]].set_index(file_data.index[reused]) if reused.any() else None
+        columns = list(reused_data.columns) if reused_data is not None else list(changed_data.columns)
+        columns += [column for column in changed_data.columns if column not in columns]
+        # An empty frame of changed rows is left out, so its dtypes don't sway the merged ones
+        frames = [frame for frame in [reused_data, changed_data] if frame is not None and len(frame)]
+        file_data = pd.concat(frames or [changed_data])
+        file_data = file_data.reindex(columns=columns).sort_index().fillna("")
+
+        # Rows are stored before duplicate marking, which depends on the whole file and is redone every run
+        store.save(header, keys, fingerprints, file_data)
+        self.count_errors(file_data)
+        self.mark_duplicates(file_data)
+        file_formats.write_frame(file_data, self.output_path, self.output_format)
+        self.row_report = {"reused": int(reused.sum()), "recomputed": int((~reused).sum())}
+        logger.info("Rows reused: %d, recomputed: %d", self.row_report['reused'], self.row_report['recomputed'],
+                    extra=self.row_report)
+
+    def compact(self, file_data):
+        # In memory-optimized mode, converts the loaded text to compact dtypes and adds up the memory saved
+        if not self.memory_optimized:
+            return file_data
+        report = compact.compact_frame(file_data, keep_text=self.resolve_columns(file_data, self.TEXT_COLUMNS))
+        self.memory_report = compact.merge_memory_reports([self.memory_report, report])
+        logger.info("Compacted text columns: %.1f MB -> %.1f MB", report["before"] / 2 ** 20, report["after"] / 2 ** 20,
+                    extra=report)
+        return file_data
+
+    def count_errors(self, file_data):
+        # Adds a cleansed frame's rows and its non-blank error cells to the run's counts
+        self.row_count += len(file_data)
+        for column in file_data.columns:
+            if column.endswith(" Errors"):
+                field = column[:-len(" Errors")].lower()
+                flagged = int((file_data[column].fillna("").astype(str) != "").sum())
+                self.error_counts[field] = self.error_counts.get(field, 0) + flagged
+
+    def duplicate_columns(self, file_data):
+        # The column each field compared by duplicate detection is read from, for those the file has
+        schema = schema_resolver.resolve(file_data.columns)
+        return {field: schema.column(source) for field, source in self.DUPLICATE_FIELDS.items() if source in schema}
+
+    def find_duplicates(self, fields, row_count):
+        # Returns the cluster and score columns, and adds the step to stage_report
+        start = time.perf_counter()
+        clusters, scores, pair_count = duplicates.find_duplicates(fields)
+        in_cluster = clusters > 0
+        cluster_column = pd.Series(clusters, dtype=object).where(in_cluster, "")
+        score_column = pd.Series(scores.round(2), dtype=object).where(in_cluster, "")
+        self.stage_report.append({
+            "stage": "mark_duplicates",
+            "seconds": time.perf_counter() - start,
+            "rows": row_count,
+            "memory_delta": int(cluster_column.memory_usage(deep=True) + score_column.memory_usage(deep=True)),
+            "columns": None,
+            "skipped": False,
+        })
+        logger.info("Duplicates: %d rows in %d clusters (%d candidate pairs compared)",
+                    int(in_cluster.sum()), int(clusters.max(initial=0)), pair_count)
+        return cluster_column, score_column
+
+    def mark_duplicates(self, file_data):
+        # Cross-row, so it runs on the whole cleansed file rather than as a (row by row) pipeline stage
+        if not DETECT_DUPLICATES:
+            return
+        columns = self.duplicate_columns(file_data)
+        if not columns:
+            logger.warning("Duplicate Columns Not Found")
+            return
+        fields = {field: file_data[column].reset_index(drop=True) for field, column in columns.items()}
+        cluster_column, score_column = self.find_duplicates(fields, len(file_data))
+        file_data[self.DUPLICATE_COLUMNS[0]] = cluster_column.to_numpy()
+        file_data[self.DUPLICATE_COLUMNS[1]] = score_column.to_numpy()
+
+    def mark_duplicates_in_file(self, output_path, chunk_size):
+        # Reads only the compared columns of a written CSV, then rewrites it chunk by chunk with the duplicate columns
+        if not DETECT_DUPLICATES_CHUNKED:
+            return
+        header = pd.read_csv(output_path, nrows=0)
+        columns = self.duplicate_columns(header)
+        if not columns:
+            logger.warning("Duplicate Columns Not Found")
+            return
+        compared = pd.read_csv(output_path, dtype=str, keep_default_na=False, usecols=list(set(columns.values())))
+        fields = {field: compared[column] for field, column in columns.items()}
+        cluster_column, score_column = self.find_duplicates(fields, len(compared))
+        del compared, fields
+
+        partial_path = f"{output_path}.part"
+        with pd.read_csv(output_path, chunksize=chunk_size, dtype=str, keep_default_na=False) as reader:
+            for chunk_number, file_data in enumerate(reader):
+                file_data[self.DUPLICATE_COLUMNS[0]] = cluster_column.iloc[file_data.index].to_numpy()
+                file_data[self.DUPLICATE_COLUMNS[1]] = score_column.iloc[file_data.index].to_numpy()
+                file_data.to_csv(partial_path, mode='w' if chunk_number == 0 else 'a', header=chunk_number == 0,
+                                 index=False, quoting=1)
+        os.replace(partial_path, output_path)
+
+    def cleanse_rows(self, file_data):
+        # Cleanses a whole frame, shared across worker processes when more than one is configured
+        if self.workers > 1:
+            if self.progress:
+                self.progress("cleanse_parallel", 1, 1)
+            file_data, self.stage_report, lookups = cleanse_parallel(file_data, self.workers)
+            for key, count in lookups.items():
+                self.country_lookups[key] += count
+            return file_data
+        return self.cleanse(file_data)
+
+    def normalise_file_data(self, file_data):
         file_data.columns = file_data.columns.str.strip()
-        file_data = file_data.applymap(lambda x: x.strip() if isinstance(x, str) else x)
+        # Columnar inputs arrive as Arrow dtypes; trim their text there and bring them in line with CSV input
+        file_data = file_formats.to_working_dtypes(file_data)
+        file_data = compact.trim_text(file_data)
         file_data.rename(columns=lambda x: x.capitalize() if not x[0].isupper() else x, inplace=True)
-        self.process_id_col(file_data)
-        self.process_phone(file_data)
-        self.process_landline(file_data)
-        self.process_postcode(file_data)
-        self.process_email(file_data)                          
-        self.process_address(file_data)
-        self.process_phone(file_data)
-        self.remove_parent_duplicates(file_data)
-        self.convert_countries_to_iso(file_data)
-        self.create_error_columns(file_data)
+        # Every stage finds its columns through this mapping, worked out once for the file's header
+        self.schema = schema_resolver.resolve(file_data.columns)
+        return file_data
+
+    def cleanse(self, file_data):
+        # Every stage works row by row, so this runs equally on a whole file or on one chunk;
+        # timings of successive chunks add up in stage_report. Chunks (and the partitions
+        # cleansed by parallel workers) share a header, so their schema comes from the cache.
+        self.schema = schema_resolver.resolve(file_data.columns)
+        report = self.PIPELINE.run(self, file_data, progress=self.progress)
+        self.stage_report = merge_reports([self.stage_report, report])
+        return file_data
+
+    def fill_blanks(self, file_data):
+        # Categoricals need the blank as a category before it can fill them
+        for position, dtype in enumerate(file_data.dtypes):
+            if isinstance(dtype, pd.CategoricalDtype):
+                file_data.isetitem(position, compact.fill_blank_categories(file_data.iloc[:, position]))
         file_data.fillna("", inplace=True)
         file_data.replace({"nan": "", pd.NaT: ""}, inplace=True)
-        file_data.to_csv(os.path.join(PROCESSED_FOLDER, os.path.basename(file_path)), index=False, quoting=1)
+
+    def stage_outputs(self, stage, file_data):
+        # Columns a stage wrote: its declared outputs that exist, plus any it relocated values in or out of
+        columns = set(self.relocated_columns) | self.resolve_columns(file_data, stage.outputs)
+        self.relocated_columns.clear()
+        return columns
+
+    def resolve_columns(self, file_data, names):
+        # Maps field names (keys of COLUMN_ALIASES) and literal header names to the columns present
+        columns = set()
+        for name in names:
+            if name in self.COLUMN_ALIASES:
+                if name in self.schema:
+                    columns.add(self.schema.column(name))
+            elif name in file_data.columns:
+                columns.add(name)
+        return columns
 
     # Targeting Columns           
     
 
     def process_postcode(self, file_data):
         file_data['Postcode Errors'] = ""
-        post_code_col_names = ["Post_Code", "postcode", "postal_code", "zip_code", "pc"]
-        expected_postcode_col_idx = self.get_expected_col_idx(file_data, post_code_col_names)
+        postcode_col_name = self.schema.column("postcode")
         
-        if expected_postcode_col_idx is None:
-            print("PostCode Column Not Found")
+        if postcode_col_name is None:
+            logger.warning("PostCode Column Not Found")
             return file_data
 
-        postcode_col_name = file_data.columns[expected_postcode_col_idx]
-
         # Validate and process postcodes using the existing methods
-        self.process_all_rows(file_data, self.valid_postcode, expected_postcode_col_idx)
-        self.convert_postcode_to_uppercase(file_data, expected_postcode_col_idx)
+        self.process_all_rows(file_data, "postcode", file_data.columns.get_loc(postcode_col_name))
+        self.convert_postcode_to_uppercase(file_data, postcode_col_name)
 
-    def convert_postcode_to_uppercase(self, file_data, expected_col_idx):
-        col_name = file_data.columns[expected_col_idx]
+    def convert_postcode_to_uppercase(self, file_data, col_name):
         file_data[col_name] = file_data[col_name].str.upper()
-        print(f"Postcode values in column '{col_name}' converted to uppercase.")
+        logger.debug("Postcode values in column '%s' converted to uppercase.", col_name)
         
     def convert_countries_to_iso(self, file_data):
-        country_column = "Country"  
-        if country_column in file_data.columns:  # Check if the 'Country' column exists
-            for index, row in file_data.iterrows():
-                country_name = row[country_column]
-                if pd.notna(country_name):
-                    country_iso = self.get_iso_code(country_name)
-                    if country_iso:
-                        file_data.at[index, country_column] = country_iso
-                    else:
-                        print(f"ISO code not found for country: {country_name}")
+        country_column = self.schema.column("country")
+        if country_column is not None:  # Check if the 'Country' column exists
+            # Each distinct spelling is resolved once, then mapped back over the column
+            before = country_resolver.stats()
+            file_data[country_column], unresolved = country_resolver.resolve_series(file_data[country_column])
+            after = country_resolver.stats()
+            for key in self.country_lookups:
+                self.country_lookups[key] += after[key] - before[key]
+            if unresolved:
+                summary = ", ".join(f"{country_name} ({count} rows)" for country_name, count in unresolved.items())
+                logger.warning("ISO code not found for countries: %s", summary)
         else:
-            print("Warning: 'Country' column not found in the dataset. Skipping conversion to ISO.")
-
-        # Write the updated data back to the dataframe or file if needed       
+            logger.warning("'Country' column not found in the dataset. Skipping conversion to ISO.")
 
     def get_iso_code(self, country_name):
-        try:
-            country = pycountry.countries.lookup(country_name)
-            return country.alpha_3
-        except LookupError:
-            return None 
+        return country_resolver.resolve(country_name)
             
     def process_id_col(self, file_data):
-        id_col_names = ["ID", "Usr_ID", "User_ID"]
-        expected_col_idx = self.get_expected_col_idx(file_data, id_col_names)
-        if expected_col_idx is None:
-            print("ID Column Not Found")
+        col_name = self.schema.column("id")
+        if col_name is None:
+            logger.warning("ID Column Not Found")
             return file_data
-        col_name = file_data.columns[expected_col_idx]
         
         # Remove letters from the ID column, keeping specified special characters
         file_data[col_name] = file_data[col_name].apply(lambda x: re.sub(r'[A-Za-z]', '', str(x)))
         
       
-    def process_phone(self, file_data):
-        phone_col_names = ["phone", "Phone", "Phone Number"]
-        expected_col_idx = self.get_expected_col_idx(file_data, phone_col_names)
-        if expected_col_idx is None:
-            print("Phone Column Not Found")
+    def process_phone(self, file_data, columns=None):
+        col_name = self.schema.column("phone")
+        if col_name is None:
+            logger.warning("Phone Column Not Found")
             return
-        col_name = file_data.columns[expected_col_idx]
+        expected_col_idx = file_data.columns.get_loc(col_name)
 
-        # Apply existing phone validation to all rows in the phone column
-        self.process_all_rows(file_data, self.valid_phone, expected_col_idx)
+        # Apply existing phone validation to all rows in the phone column (or only the given columns)
+        self.process_all_rows(file_data, "phone", expected_col_idx, columns)
 
         # Remove letters from the phone numbers, keeping specified special characters
         file_data[col_name] = file_data[col_name].apply(lambda x: re.sub(r'[A-Za-z]', '', str(x)))
@@ -117,15 +486,14 @@ class DataCleanse:
         file_data[col_name] = file_data[col_name].apply(self.remove_values_within_parentheses)
         
     def process_landline(self, file_data):
-        phone_col_names = ["landline"]
-        expected_col_idx = self.get_expected_col_idx(file_data, phone_col_names)
-        if expected_col_idx is None:
-            print("Landline Column Not Found")
+        col_name = self.schema.column("landline")
+        if col_name is None:
+            logger.warning("Landline Column Not Found")
             return
-        col_name = file_data.columns[expected_col_idx]
+        expected_col_idx = file_data.columns.get_loc(col_name)
 
         # Apply existing landline validation to all rows in the landline column
-        self.process_all_rows(file_data, self.valid_landline, expected_col_idx)
+        self.process_all_rows(file_data, "landline", expected_col_idx)
 
         # Remove letters from the landline numbers, keeping specified special characters
         file_data[col_name] = file_data[col_name].apply(lambda x: re.sub(r'[A-Za-z]', '', str(x)))
@@ -141,85 +509,58 @@ class DataCleanse:
         return re.sub(pattern, "", input_string)
 
     def process_email(self, file_data):
-        email_col_names = ["email", "email address"]
-        expected_col_idx = self.get_expected_col_idx(file_data, email_col_names)
-        if expected_col_idx is None:
-            print("Email Column Not Found")
+        col_name = self.schema.column("email")
+        if col_name is None:
+            logger.warning("Email Column Not Found")
             return file_data
-        self.process_all_rows(file_data, self.valid_email, expected_col_idx)
+        self.process_all_rows(file_data, "email", file_data.columns.get_loc(col_name))
+
         # Preprocess the email column: replace spaces with commas only if no commas are present
-        file_data[file_data.columns[expected_col_idx]] = file_data[file_data.columns[expected_col_idx]].apply(
-            lambda email: str(email).replace(" ", ",") if "," not in str(email) else email
-        )
-        
-        # Validate and fill error column for original email column
-        email_errors_column_name = "Email Errors"
-        file_data[email_errors_column_name] = ""
-        for index, row in file_data.iterrows():
-            email_value = str(row[file_data.columns[expected_col_idx]])
-            if email_value.strip() and not self.valid_email(email_value.strip()):
-                file_data.at[index, email_errors_column_name] = email_value.strip()
-        
-        # Check if "Emails (Additional)" column already exists
-        if "Emails (Additional)" in file_data.columns:
-            additional_emails_col_name = "Emails (Additional)"
-            # Iterate over each row
-            for index, row in file_data.iterrows():
-                email_values = str(row[file_data.columns[expected_col_idx]]).split(",")  # Split email values at commas
-                if len(email_values) > 1:
-                    # Move additional emails to "Emails (Additional)" column
-                    file_data.at[index, additional_emails_col_name] = ", ".join(email_values[1:]).strip()
-                    # Update the original column with the first email
-                    file_data.at[index, file_data.columns[expected_col_idx]] = email_values[0].strip()
+        emails = compact.as_text(file_data[col_name])
+        emails = emails.where(emails.str.contains(",", regex=False), emails.str.replace(" ", ",", regex=False))
 
-            
+        # Keep the first email in the original column and move the rest to the additional emails column
+        # (reindexed, as partition gives no columns at all for a frame without rows)
+        parts = emails.str.partition(",").reindex(columns=[0, 1, 2], fill_value="")
+        multiple = parts[1] != ""
+        file_data[col_name] = emails.where(~multiple, parts[0].str.strip())
+        additional_emails = parts.loc[multiple, 2].str.split(",").str.join(", ").str.strip()
 
+        # Provisional errors: the whole value, before splitting, where it isn't a valid email. The second
+        # phone pass can move values through this column; create_error_columns then flags the final email.
+        unsplit = emails.str.strip()
+        file_data["Email Errors"] = unsplit.where((unsplit != "") & ~validators.match_series("email", unsplit), "")
+
+        # Check if "Emails (Additional)" column already exists, otherwise create "Additional Emails"
+        if "Emails (Additional)" in file_data.columns:
+            additional_emails_col_name = "Emails (Additional)"
         else:
-            # Create "Additional Emails" column
             additional_emails_col_name = "Additional Emails"
-            # Initialize the additional email column
             file_data[additional_emails_col_name] = ""
-            # Move additional emails to "Additional Emails" column
-            for index, row in file_data.iterrows():
-                email_values = str(row[file_data.columns[expected_col_idx]]).split(",")  # Split email values at commas
-                if len(email_values) > 1:
-                    # Move additional emails to "Additional Emails" column
-                    file_data.at[index, additional_emails_col_name] = ", ".join(email_values[1:]).strip()
-                    # Update the original column with the first email
-                    file_data.at[index, file_data.columns[expected_col_idx]] = email_values[0].strip()
-
-            # Create error column for "Additional Emails"
-            additional_emails_errors_column_name = "Additional Emails Errors"
-            file_data[additional_emails_errors_column_name] = ""
-            # Iterate over each row in "Additional Emails" column
-            for index, row in file_data.iterrows():
-                email_values = str(row[additional_emails_col_name]).split(",")  # Split email values at commas
-                for email in email_values:
-                    email = email.strip()  # Remove leading/trailing whitespaces
-                    if email and not self.valid_email(email):
-                        # Flag invalid emails in the "Additional Emails Errors" column
-                        file_data.at[index, additional_emails_errors_column_name] += email + ", "
-            # Remove trailing comma from error column
-            file_data[additional_emails_errors_column_name] = file_data[additional_emails_errors_column_name].str.rstrip(", ")
+        file_data.loc[multiple, additional_emails_col_name] = additional_emails
 
-        
+        # Flag each invalid address in the additional emails column
+        file_data[f"{additional_emails_col_name} Errors"] = self.invalid_email_list(file_data[additional_emails_col_name])
 
         return file_data
 
-        
+    def invalid_email_list(self, email_lists):
+        # Split comma separated emails, validate each one, and join the invalid ones back per row
+        emails = compact.as_text(email_lists).str.split(",").explode().str.strip()
+        invalid = emails[(emails != "") & ~validators.match_series("email", emails)]
+        return invalid.groupby(level=0, sort=False).agg(", ".join).reindex(email_lists.index, fill_value="")
+
     def process_address(self, file_data):
-        address_col_names = ["street address 1", "street address 2", "address", "address 2"]
-        expected_col_idx = self.get_expected_col_idx(file_data, address_col_names)
+        street_address_1_col = self.schema.column("street_address_1")
+        street_address_2_col = self.schema.column("street_address_2")
 
         # Check if any of the address columns exist
-        if expected_col_idx is None:
-            print("Address Columns Not Found")
+        if street_address_1_col is None and street_address_2_col is None and "address" not in self.schema:
+            logger.warning("Address Columns Not Found")
             return
 
         # Check if both "Street Address 1" and "Street Address 2" columns exist
-        if "Street Address 1" in file_data.columns and "Street Address 2" in file_data.columns:
-            street_address_1_col = "Street Address 1"
-            street_address_2_col = "Street Address 2"
+        if street_address_1_col is not None and street_address_2_col is not None:
             # Check if Street Address 1 is null for all rows
             if file_data[street_address_1_col].isnull().all():
                 # If Street Address 1 is null for all rows, set it to Street Address 2
@@ -233,193 +574,251 @@ class DataCleanse:
                 # Remove duplicates from Street Address 2
                 file_data[street_address_2_col] = file_data[street_address_2_col].where(file_data[street_address_1_col] != file_data[street_address_2_col], "")
         else:
-            # If either column is missing, print a message
-            if "Street Address 1" not in file_data.columns:
-                print("Street Address 1 Column Not Found")
-            if "Street Address 2" not in file_data.columns:
-                print("Street Address 2 Column Not Found")
+            # If either column is missing, log it
+            if street_address_1_col is None:
+                logger.warning("Street Address 1 Column Not Found")
+            if street_address_2_col is None:
+                logger.warning("Street Address 2 Column Not Found")
 
         return file_data
 
             
     def remove_parent_duplicates(self, file_data):
-        special_col_names = ["Name", "Site", "Customer"]
-        expected_col_idx = self.get_expected_col_idx(file_data, special_col_names)
+        special_fields = ["name", "site", "customer"]
+        parent_col = self.schema.column("parent")
         
         # Check if "Parent" column exists in the dataset
-        if "Parent" in file_data.columns:
+        if parent_col is not None:
             # Strip leading and trailing whitespaces from the "Parent" column
-            file_data["Parent"] = file_data["Parent"].str.strip()
+            if isinstance(file_data[parent_col].dtype, pd.CategoricalDtype):
+                # Once per category, keeping a blank category for the duplicates cleared below
+                file_data[parent_col] = compact.with_blank_category(compact.map_categories(file_data[parent_col], str.strip))
+            else:
+                file_data[parent_col] = file_data[parent_col].str.strip()
             
-            # Iterate through each column in special_col_names
-            for col_name in special_col_names:
+            # Iterate through each of the name, site and customer columns
+            for field in special_fields:
+                col_name = self.schema.column(field)
                 # Check if the column exists in the dataset
-                if col_name in file_data.columns:
+                if col_name is not None:
                     # Identify rows where "Parent" values match values in the current column
-                    duplicates_mask = file_data["Parent"] == file_data[col_name]
+                    # Compared as values: categoricals only compare with the same categories
+                    duplicates_mask = file_data[parent_col].astype(object) == file_data[col_name].astype(object)
                     
                     if duplicates_mask.any():
                         # Set duplicate "Parent" values to an empty string
-                        file_data.loc[duplicates_mask, "Parent"] = ""
-                        print(f"Duplicates between 'Parent' and '{col_name}' columns removed.")
+                        file_data.loc[duplicates_mask, parent_col] = ""
+                        logger.debug("Duplicates between 'Parent' and '%s' columns removed.", col_name)
                     else:
-                        print(f"No duplicates found between 'Parent' and '{col_name}' columns.")
+                        logger.debug("No duplicates found between 'Parent' and '%s' columns.", col_name)
                 else:
-                    print(f"Error: '{col_name}' column not found in the dataset.")
+                    logger.debug("'%s' column not found in the dataset.", field.capitalize())
         else:
-            print("Error: 'Parent' column not found in the dataset.")
+            logger.warning("'Parent' column not found in the dataset.")
         
         return file_data
         
     def create_error_columns(self, file_data):
-        # Define the columns to create error columns for
-        columns_to_check = ["postcode", "phone", "email", "landline", "additional emails", "emails (additional)"]
-
-        # Initialize variables for the additional emails column and its errors column
-        additional_emails_column_name = "Additional Emails"
-        additional_emails_errors_column_name = "Additional Emails Errors"
-
-        # Check if "Emails (Additional)" exists in the dataset
-        if "Emails (Additional)" in file_data.columns:
-            additional_emails_column_name = "Emails (Additional)"
-            additional_emails_errors_column_name = "Emails (Additional) Errors"
-
-            # Create the error column for "Emails (Additional)"
-            file_data[additional_emails_errors_column_name] = ""
+        # Define the fields to create error columns for (email errors are flagged below)
+        fields_to_check = [field for field in ["postcode", "phone", "landline"] if field in self.schema]
 
-            # Iterate over each row to validate emails in "Emails (Additional)" column and fill error column
-            for index, row in file_data.iterrows():
-                email_values = str(row[additional_emails_column_name]).split(",")  # Split email values at commas
-                for email in email_values:
-                    email = email.strip()  # Remove leading/trailing whitespaces
-                    if email and not self.valid_email(email):
-                        file_data.at[index, additional_emails_errors_column_name] += email + ", "
+        # Create the error columns in the order their fields' columns appear in the file
+        for field in sorted(fields_to_check, key=lambda field: file_data.columns.get_loc(self.schema.column(field))):
+            column_name = self.schema.column(field)
+            error_column_name = f"{field.capitalize()} Errors"
 
-            # Remove trailing comma from error column
-            file_data[additional_emails_errors_column_name] = file_data[additional_emails_errors_column_name].str.rstrip(", ")
+            # Fill the error column with invalid values from the corresponding column
+            invalid_values_mask = ~validators.match_series(field, file_data[column_name])
+            file_data.loc[invalid_values_mask, error_column_name] = file_data.loc[invalid_values_mask, column_name]
 
-        else:
-            # If "Emails (Additional)" column does not exist, set the error column name to None
-            additional_emails_errors_column_name = None
-
-        # Iterate over each column to create error columns
-        for column_name in file_data.columns:
-            for check_column in columns_to_check:
-                # Replace spaces with underscores in check_column
-                check_column_attr = check_column.lower().replace(" ", "_")
-                
-                if check_column_attr in column_name.lower():
-                    # Determine the error column name based on the existence of "Emails (Additional)"
-                    error_column_name = additional_emails_errors_column_name if check_column_attr == "emails_(additional)" else f"{check_column.capitalize()} Errors"
-                    valid_func = getattr(self, f"valid_{check_column_attr}")
-                    
-                    # Fill the error column with invalid values from the corresponding column
-                    invalid_values_mask = ~file_data.apply(lambda row: valid_func(str(row[column_name])), axis=1)
-                    file_data.loc[invalid_values_mask, error_column_name] = file_data.loc[invalid_values_mask, column_name]
-
-        # Check for variations of the email column name and create an "Email Errors" column to mark down email errors
-        email_column_variations = ["email", "Email", "Email Address"]
-        for variation in email_column_variations:
-            if variation in file_data.columns:
-                file_data["Email Errors"] = ""
-                for index, row in file_data.iterrows():
-                    email_value = str(row[variation])
-                    # Check if the email contains multiple "@" symbols or multiple email addresses
-                    if email_value.count("@") > 1 or len(email_value.split()) > 1:
-                        # Mark down the email address as an error in the "Email Errors" column
-                        file_data.at[index, "Email Errors"] = email_value
-                    elif not self.valid_email(email_value):  # Check if email is invalid
-                        file_data.at[index, "Email Errors"] = email_value
+        # Flag the final email if it still holds several addresses or is invalid
+        if "email" in self.schema:
+            primary = compact.as_text(file_data[self.schema.column("email")])
+            email_errors = (
+                (primary.str.count("@") > 1)
+                | primary.str.contains(r"\S\s+\S", regex=True)
+                | ~validators.match_series("email", primary)
+            )
+            file_data["Email Errors"] = primary.where(email_errors, "")
 
         return file_data
 
-    def get_expected_col_idx(self, file_data, column_names):
-        for idx, column in enumerate(file_data.columns):
-            if column.lower() in column_names:
-                return idx
-        return None      
-
-    def process_all_rows(self, file_data, valid, expected_col_idx):
-        for row_idx, row in file_data.iterrows():
-            for col_idx, column in enumerate(file_data.columns):
-                if valid(str(row[column])) and col_idx != expected_col_idx:
-                    self.swap_col_data(file_data, row_idx, col_idx, expected_col_idx)
+    def process_all_rows(self, file_data, field, expected_col_idx, columns=None):
+        # Match every column (or only the given ones) at once, then move the valid values into the expected column
+        col_indices = None if columns is None else [file_data.columns.get_loc(column) for column in columns]
+        mask = relocate_matches(
+            file_data, lambda column: validators.match_series(field, column), expected_col_idx, col_indices
+        )
+        if mask.any():
+            self.relocated_columns.update(file_data.columns[mask.any(axis=0)])
+            self.relocated_columns.add(file_data.columns[expected_col_idx])
 
     #validation/regex
 
     def valid_postcode(self, post_code):
-        uk_post_code_pattern = r"^([Gg][Ii][Rr] 0[Aa]{2})|((([A-Za-z][0-9]{1,2})|(([A-Za-z][A-Ha-hJ-Yj-y][0-9]{1,2})|(([A-Za-z][0-9][A-Za-z])|([A-Za-z][A-Ha-hJ-Yj-y][0-9][A-Za-z]?))))\s?[0-9][A-Za-z]{2})"
-        american_pc_pattern = r"^\d{5}(-\d{4})?$"
-
-        return bool(re.match(uk_post_code_pattern, post_code))
+        return validators.is_valid("postcode", post_code)
         
     def validate_pcl(self, file_data):
-        post_code_col_names = ["postcode", "postal_code", "zip_code", "pc"]
-        expected_col_idx = self.get_expected_col_idx(file_data, post_code_col_names)
-        if expected_col_idx is None:
-            print("PostCode Column Not Found")
+        schema = schema_resolver.resolve(file_data.columns)
+        col_name = schema.column("postcode")
+        if col_name is None:
+            logger.warning("PostCode Column Not Found")
             return file_data
 
-        col_name = file_data.columns[expected_col_idx]
+        if 'Postcode Errors' not in file_data.columns:
+            file_data['Postcode Errors'] = ""
 
-        # Iterate through each row to match postcode to ISO code and handle errors
-        for index, row in file_data.iterrows():
-            postcode = row[col_name]
-            iso_code = matcher.match_postcode_to_iso(postcode)
-            if iso_code is None:
-                # If no matching ISO code is found, set the error value
-                file_data.at[index, 'Postcode Errors'] = f'Postcode {postcode} does not match any country ISO code pattern.'
-            else:
-                # If a matching ISO code is found, check if the postcode matches the pattern for the ISO code
-                if not matcher.validate_postcode_for_country(postcode, iso_code):
-                    # If the postcode does not match the pattern, flag it in the error column
-                    file_data.at[index, 'Postcode Errors'] = f'Postcode {postcode} does not match the pattern for country {iso_code}.'
+        # Each distinct postcode is looked up once by its shape, then confirmed with that shape's country patterns
+        postcodes = file_data[col_name]
+        matches = matcher.match_series(postcodes)
+        present = postcodes.map(normalise_postcode) != ""
+        unmatched = present & (matches.str.len() == 0)
+        file_data.loc[unmatched, 'Postcode Errors'] = postcodes[unmatched].map(
+            lambda postcode: f'Postcode {postcode} does not match any country ISO code pattern.')
+
+        # Where the row gives a country, check the postcode is one of that country's
+        if "country" in schema:
+            iso_codes, _ = country_resolver.resolve_series(file_data[schema.column("country")])
+            mismatched = matcher.cross_check_countries(postcodes, iso_codes)
+            file_data.loc[mismatched, 'Postcode Errors'] = [
+                f'Postcode {postcode} does not match the pattern for country {iso_code}.'
+                for postcode, iso_code in zip(postcodes[mismatched], iso_codes[mismatched])
+            ]
 
         return file_data
           
     def valid_phone(self, phone):
-        if self.valid_phone_for_country(phone, "United Kingdom"):
-            return True
-        elif self.valid_phone_for_country(phone, "United States"):
-            return True
-        elif self.valid_phone_for_country(phone, "Ireland"):
-            return True
-        # Add more conditions for other countries...
-        else:
-            return False
+        # Valid for any country with a registered phone pattern
+        return validators.is_valid("phone", phone)
             
     def valid_phone_for_country(self, phone, country):
-        if country == "United Kingdom":
-            uk_phone_pattern = r"^\d{3}\s\d{8,}$"
-            return bool(re.match(uk_phone_pattern, phone))
-        elif country == "United States":
-            usa_phone_pattern = r"^\(?\d{3}\)?[\s.-]?\d{3}[\s.-]?\d{4}$"
-            return bool(re.match(usa_phone_pattern, phone))
-        elif country == "Ireland":
-            ireland_phone_pattern = r"^\(?\d{3}\)?[\s.-]?\d{3}[\s.-]?\d{4}$"  # Example pattern for Ireland, adjust as needed
-            return bool(re.match(ireland_phone_pattern, phone))
-        # Add more conditions for other countries...
-        else:
-            return False
+        iso_code = country_resolver.resolve(country)
+        return iso_code is not None and validators.is_valid("phone", phone, iso_code)
+
     def valid_landline(self, phone):
-        uk_phone_pattern = r"^(\d{2}\s\d{5}\s\d{5})$"
-        return bool(re.match(uk_phone_pattern, phone))
+        return validators.is_valid("landline", phone)
     
     def valid_email(self, email):
-        email_pattern = email_pattern = r'\S+@\S+\.\S+'
-        return bool(re.match(email_pattern, email))
+        return validators.is_valid("email", email)
         
     def valid_additional(self, email):
-        add_email = r"[\w\.-]+@[\w\.-]+(?:,\s*[\w\.-]+@[\w\.-]+)*"
-        return bool(re.match(add_email, email))
+        return validators.is_valid("additional", email)
            
     #validation/regex
 
-    def swap_col_data(self, file_data, row_idx, col_idx_src, col_idx_des):
-        src_col_data = file_data.iloc[row_idx, col_idx_src]
-        des_col_data = file_data.iloc[row_idx, col_idx_des]
-        file_data.iloc[row_idx, col_idx_des] = src_col_data
-        file_data.iloc[row_idx, col_idx_src] = des_col_data
+# Cached results and row stores are keyed by everything that decides the output, so changing
+# a pattern, alias or stage invalidates them
+RULESET_VERSION = ruleset_version(
+    CACHE_VERSION,
+    {field: {iso_code: pattern.pattern for iso_code, pattern in countries.items()}
+     for field, countries in validators.compiled.items()},
+    DataCleanse.COLUMN_ALIASES,
+    [stage.name for stage in DataCleanse.PIPELINE.stages],
+    DETECT_DUPLICATES_CHUNKED,
+    DETECT_DUPLICATES and [DataCleanse.DUPLICATE_FIELDS, duplicates.FIELD_WEIGHTS, duplicates.EMAIL_LOCAL_PART_CREDIT,
+                           duplicates.DUPLICATE_THRESHOLD, duplicates.MIN_COMPARED_WEIGHT,
+                           duplicates.BLOCKING_KEYS, duplicates.BLOCK_WINDOW],
+)
+result_cache = ResultCache(RESULT_CACHE_FOLDER, RESULT_CACHE_MAX_BYTES, RULESET_VERSION)
+# Field-to-column mappings per header layout, shared by every DataCleanse in this process
+schema_resolver = SchemaResolver(DataCleanse.COLUMN_ALIASES)
+
+def save_uploaded_file(file, name=None):
+    # Saves an upload under its own name (or the one given), returning its path, content hash and sniffed read_csv options
+    filename, content_hash, csv_options = save_stream(file.stream, name or file.filename)
+    bytes_received.inc(os.path.getsize(filename), route=request_route())
+    return filename, content_hash, csv_options
+
+def save_stream(stream, name):
+    # Streams a file to the upload folder, returning its path, content hash and sniffed read_csv options.
+    # It is written under a temporary name so a half-written upload never replaces a previous one.
+    filename = os.path.join(UPLOAD_FOLDER, os.path.basename(name))
+    partial_filename = f"{filename}.part"
+    try:
+        content_hash, csv_options = save_upload(stream, partial_filename)
+    except Exception:
+        if os.path.exists(partial_filename):
+            os.remove(partial_filename)
+        raise
+    os.replace(partial_filename, filename)
+    return filename, content_hash, csv_options
+
+def submit_cleanse(filename, csv_options, output_format, incremental=INCREMENTAL):
+    # Queues a saved upload on the worker pool with the app's settings; returns the job ID, or None if the queue is full
+    return jobs.submit(filename, chunk_size=CHUNK_SIZE, workers=PARALLEL_WORKERS, csv_options=csv_options,
+                       output_format=output_format, incremental=incremental, request_id=g.request_id,
+                       memory_optimized=MEMORY_OPTIMIZED)
+
+def cleanse_upload(file, output_format=None):
+    # Serves a repeated upload from the result cache, otherwise cleanses it. Returns the processed
+    # file path and the job result with its stage timings and row counts (None when served from the cache),
+    # or (None, None) when the job queue is full.
+    # Formats are settled first so an unsupported one is refused before the upload is saved
+    input_format = file_formats.format_for_path(file.filename)
+    output_format = file_formats.format_for_path(file.filename, output_format or input_format)
+    filename, content_hash, csv_options = save_uploaded_file(file)
+    processed_filename = file_formats.output_path(PROCESSED_FOLDER, filename, output_format)
+    cache_key = None
+    if result_cache.enabled():
+        mode = 'incremental' if INCREMENTAL else 'chunked' if CHUNK_SIZE else 'whole'
+        cache_key = result_cache.key(content_hash, f"{mode}-{input_format}-{output_format}")
+        cached = result_cache.get(cache_key)
+        if cached:
+            shutil.copyfile(cached, processed_filename)
+            logger.info("Served %s from the result cache", filename)
+            return processed_filename, None
+    # Cleanse on the worker pool so the CPU-bound work stays off the request thread
+    job_id = submit_cleanse(filename, csv_options, output_format)
+    if job_id is None:
+        return None, None
+    result = jobs.wait(job_id)
+    if cache_key:
+        result_cache.put(cache_key, result['output'])
+    return result['output'], result
+
+def stream_processed_file(processed_filename, as_attachment=False):
+    # Sends the file in blocks (gzip-compressed when the client accepts it), never holding it all in memory
+    compress = 'gzip' in request.accept_encodings
+    mimetype = file_formats.MIMETYPES[file_formats.format_for_path(processed_filename)]
+    blocks = count_bytes(stream_file(processed_filename, compress=compress), request_route())
+    response = Response(blocks, mimetype=mimetype)
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+        response.headers['Vary'] = 'Accept-Encoding'
+    else:
+        response.headers['Content-Length'] = os.path.getsize(processed_filename)
+    if as_attachment:
+        response.headers.set('Content-Disposition', 'attachment', filename=os.path.basename(processed_filename))
+    return response
+
+def count_bytes(blocks, route):
+    # Passes a response's blocks through, adding each one to the bytes sent as it goes out
+    for block in blocks:
+        bytes_sent.inc(len(block), route=route)
+        yield block
+
+def request_route():
+    # The matched route's pattern rather than the path, so filenames don't each become a metric label
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+@app.before_request
+def start_request():
+    # Keep a well-formed ID handed in by a proxy or client, otherwise make one up
+    request_id = request.headers.get('X-Request-ID', '')
+    g.request_id = request_id if re.fullmatch(r'[\w.-]{1,64}', request_id) else tracing.new_request_id()
+    tracing.request_id.set(g.request_id)
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def finish_request(response):
+    # Streamed bodies are still to be sent, so this times the work up to the first byte
+    seconds = time.perf_counter() - g.request_start
+    route = request_route()
+    request_seconds.observe(seconds, route=route, method=request.method, status=response.status_code)
+    response.headers['X-Request-ID'] = g.request_id
+    logger.info("%s %s %s", request.method, request.path, response.status_code,
+                extra={"route": route, "status": response.status_code, "seconds": round(seconds, 3)})
+    return response
 
 @app.route('/')
 def login():
@@ -431,11 +830,20 @@ def index():
 
 @app.route('/preview/<filename>')
 def preview(filename):
-    processed_filename = os.path.join(PROCESSED_FOLDER, filename)
-    # Read the processed file and return its contents
-    with open(processed_filename, 'r') as processed_file:
-        processed_data = processed_file.read()
-    return render_template('preview.html', processed_data=processed_data)
+    # The page loads its rows from /preview_rows as the user scrolls
+    return render_template('preview.html', filename=filename, page_size=PREVIEW_PAGE_SIZE)
+
+@app.route('/preview_rows/<filename>')
+def preview_rows(filename):
+    processed_filename = safe_join(PROCESSED_FOLDER, filename)
+    if processed_filename is None or not os.path.isfile(processed_filename):
+        return jsonify(error='File not found'), 404
+    # The row-offset index pages through CSV; other formats are only offered as downloads
+    if file_formats.format_for_path(processed_filename) != 'csv':
+        return jsonify(error='Only CSV files can be previewed'), 400
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', PREVIEW_PAGE_SIZE, type=int), 1), PREVIEW_MAX_PAGE_SIZE)
+    return jsonify(preview_indexes.get(processed_filename).page(offset, limit))
 
 @app.route('/process_file', methods=['POST'])
 def process_file():
@@ -445,14 +853,15 @@ def process_file():
     if file.filename == '':
         return 'No selected file'
     if file:
-        filename = os.path.join(UPLOAD_FOLDER, file.filename)
-        file.save(filename)
-        data_cleanse = DataCleanse(filename)
-        processed_filename = os.path.join(PROCESSED_FOLDER, os.path.basename(filename))
-        # Read the processed file and return its contents
-        with open(processed_filename, 'r') as processed_file:
-            processed_data = processed_file.read()
-        return processed_data
+        try:
+            # Written in the upload's own format unless a format (csv, parquet, feather, xlsx) is asked for
+            processed_filename, result = cleanse_upload(file, request.values.get('format'))
+        except ValueError as error:
+            return str(error), 400
+        if processed_filename is None:
+            return jsonify(error=QUEUE_FULL_MESSAGE), 503
+        # Stream the processed file back rather than reading it into memory
+        return stream_processed_file(processed_filename)
     return 'Error processing file'
     
 
@@ -464,19 +873,178 @@ def process_and_preview():
     if file.filename == '':
         return 'No selected file'
     if file:
-        filename = os.path.join(UPLOAD_FOLDER, file.filename)
-        file.save(filename)
-        data_cleanse = DataCleanse(filename)
-        
-        # Process the file and save the processed data to a temporary file
-        processed_filename = os.path.join(PROCESSED_FOLDER, os.path.basename(filename))
-        with open(processed_filename, 'r') as processed_file:
-            processed_data = processed_file.read()
-        
-        # Render the preview page with the processed data
-        return render_template('preview.html', processed_data=processed_data)
+        # The preview pages through CSV; other formats are converted when downloaded
+        processed_filename, result = cleanse_upload(file, 'csv')
+        if processed_filename is None:
+            return jsonify(error=QUEUE_FULL_MESSAGE), 503
+
+        # Render the preview page (which pages in the processed rows), plus the stage timings if asked for
+        show_timings = request.values.get('timings') and result
+        return render_template('preview.html', filename=os.path.basename(processed_filename),
+                               page_size=PREVIEW_PAGE_SIZE, timings=result['timings'] if show_timings else None,
+                               rows=result['rows'] if show_timings else None,
+                               memory=result['memory'] if show_timings else None)
     return 'Error processing file'
 
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    if 'file' not in request.files:
+        return 'No file part', 400
+    file = request.files['file']
+    if file.filename == '':
+        return 'No selected file', 400
+    try:
+        output_format = file_formats.format_for_path(file.filename, request.values.get('format'))
+    except ValueError as error:
+        return str(error), 400
+    filename, content_hash, csv_options = save_uploaded_file(file)
+    job_id = submit_cleanse(filename, csv_options, output_format)
+    if job_id is None:
+        return jsonify(error=QUEUE_FULL_MESSAGE), 503
+    return jsonify(
+        job_id=job_id,
+        status_url=url_for('job_status', job_id=job_id),
+        result_url=url_for('job_result', job_id=job_id),
+    ), 202
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    status = jobs.status(job_id)
+    if status is None:
+        return jsonify(error='Unknown job'), 404
+    return jsonify(status)
+
+@app.route('/jobs/<job_id>/result')
+def job_result(job_id):
+    status = jobs.status(job_id)
+    if status is None:
+        return jsonify(error='Unknown job'), 404
+    if status['status'] != 'done':
+        # Not ready yet (or failed): report where the job is instead
+        return jsonify(status), 409
+    return stream_processed_file(status['output'], as_attachment=True)
+
+def save_batch_files(uploads, batch_id):
+    """
+    Saves each upload of a batch, and each data file inside an uploaded zip archive, under a
+    name prefixed with the batch ID.
+
+    :return: A tuple of ([(name, path, csv_options) per file], [names of archive entries left out]).
+        Names are unique within the batch, as same-named files may come from different folders.
+    :raises ValueError: If an archive or a data file in it can't be read, or it expands to more than BATCH_MAX_BYTES.
+    """
+    taken = set()
+    saved, skipped = [], []
+    try:
+        for file in uploads:
+            if not batch.is_archive(file.filename):
+                name = batch.unique_name(os.path.basename(file.filename), taken)
+                path, content_hash, csv_options = save_uploaded_file(file, f"{batch_id}_{name}")
+                saved.append((name, path, csv_options))
+                continue
+            archive_name = os.path.basename(file.filename)
+            archive_path, content_hash, csv_options = save_uploaded_file(file, f"{batch_id}_{archive_name}")
+            try:
+                members, left_out = batch.archive_members(archive_path, BATCH_MAX_BYTES, archive_name)
+                for info, member in batch.open_members(archive_path, members, archive_name):
+                    name = batch.unique_name(os.path.basename(info.filename), taken)
+                    path, content_hash, csv_options = save_stream(member, f"{batch_id}_{name}")
+                    saved.append((name, path, csv_options))
+                skipped.extend(left_out)
+            finally:
+                os.remove(archive_path)
+    except Exception:
+        # A refused or failed batch leaves none of its files behind
+        for name, path, csv_options in saved:
+            os.remove(path)
+        raise
+    return saved, skipped
+
+def run_batch(saved, requested_format):
+    # Queues every file of a batch on the worker pool, then collects the results in upload order.
+    # Returns one summary entry per file and the (name in the archive, path) of each output.
+    queued = []
+    for name, path, csv_options in saved:
+        output_format = file_formats.format_for_path(name, requested_format)
+        # Batches skip the result cache and incremental mode, so every file is cleansed in full
+        job_id = submit_cleanse(path, csv_options, output_format, incremental=False)
+        # A full queue makes room as this batch's earlier files finish
+        for _, earlier_id in queued:
+            if job_id is not None:
+                break
+            try:
+                jobs.wait(earlier_id)
+            except Exception:
+                pass  # Recorded when the results are collected below
+            job_id = submit_cleanse(path, csv_options, output_format, incremental=False)
+        queued.append((name, job_id))
+    entries, outputs, taken = [], [], set()
+    for name, job_id in queued:
+        if job_id is None:
+            entries.append({"file": name, "status": "failed", "error": QUEUE_FULL_MESSAGE})
+            continue
+        try:
+            result = jobs.wait(job_id)
+        except Exception as error:
+            logger.exception("Batch file %s failed", name)
+            entries.append({"file": name, "status": "failed", "error": str(error)})
+            continue
+        output_name = batch.unique_name(
+            os.path.basename(file_formats.output_path("", name, file_formats.format_for_path(result['output']))), taken)
+        outputs.append((output_name, result['output']))
+        entries.append({"file": name, "status": "done", "output": output_name, "rows": result['row_count'],
+                        "seconds": result['seconds'], "errors": result['errors']})
+    return entries, outputs
+
+@app.route('/process_batch', methods=['POST'])
+def process_batch():
+    # Cleanses several files, or zip archives of them, together on the worker pool and returns one zip
+    # of the processed files with a summary of every file's errors and the batch's throughput
+    uploads = [file for file in request.files.getlist('files') + request.files.getlist('file') if file.filename]
+    if not uploads:
+        return 'No selected file', 400
+    requested_format = request.values.get('format') or None
+    batch_id = uuid.uuid4().hex[:12]
+    try:
+        if requested_format:
+            file_formats.format_for_path('', requested_format)
+        saved, skipped = save_batch_files(uploads, batch_id)
+    except ValueError as error:
+        return str(error), 400
+    start = time.perf_counter()
+    outputs = []
+    try:
+        entries, outputs = run_batch(saved, requested_format)
+        summary = batch.summarise(entries + [{"file": name, "status": "skipped"} for name in skipped],
+                                  time.perf_counter() - start)
+        archive_path = os.path.join(PROCESSED_FOLDER, f"batch_{batch_id}.zip")
+        batch.write_archive(archive_path, outputs, summary)
+    finally:
+        for path in [path for _, path, _ in saved] + [path for _, path in outputs]:
+            if os.path.exists(path):
+                os.remove(path)
+    logger.info("Batch of %d files: %d rows in %.2fs", len(saved), summary['rows'], summary['seconds'], extra={
+        "batch_id": batch_id, "processed": summary['processed'], "failed": summary['failed'],
+        "skipped": summary['skipped'], "rows_per_second": round(summary['rows_per_second'], 1)})
+    response = Response(count_bytes(stream_file(archive_path), request_route()), mimetype='application/zip')
+    response.headers['Content-Length'] = os.path.getsize(archive_path)
+    response.headers.set('Content-Disposition', 'attachment', filename=os.path.basename(archive_path))
+    response.headers['X-Batch-Files'] = summary['processed']
+    response.headers['X-Batch-Rows'] = summary['rows']
+    response.headers['X-Batch-Seconds'] = f"{summary['seconds']:.3f}"
+    response.headers['X-Batch-Rows-Per-Second'] = f"{summary['rows_per_second']:.1f}"
+    # The archive is only needed until it has been sent
+    response.call_on_close(lambda: os.remove(archive_path))
+    return response
+
+@app.route('/cache_stats')
+def cache_stats():
+    return jsonify(result_cache.stats())
+
+@app.route('/metrics')
+def metrics():
+    return Response(registry.exposition(), content_type=CONTENT_TYPE)
+
 @app.route('/login', methods=['POST'])
 def login_post():
     password = request.form.get('password')
@@ -491,7 +1059,20 @@ def login_post():
 
 @app.route('/download_processed_file/<filename>')
 def download_processed_file(filename):
-    return send_from_directory(PROCESSED_FOLDER, filename, as_attachment=True)
+    processed_filename = safe_join(PROCESSED_FOLDER, filename)
+    if processed_filename is None or not os.path.isfile(processed_filename):
+        return 'File not found', 404
+    # ?format= offers the file in another format, converted on first request
+    if request.args.get('format'):
+        try:
+            processed_filename = file_formats.convert(
+                processed_filename, file_formats.format_for_path(processed_filename, request.args['format']))
+        except ValueError as error:
+            return str(error), 400
+    return stream_processed_file(processed_filename, as_attachment=True)
 
 if __name__ == "__main__":
+    # Start the pool workers before the first upload; under the debug reloader, only in the process serving requests
+    if os.environ.get('WERKZEUG_RUN_MAIN'):
+        jobs.warm()
     app.run(debug=True)
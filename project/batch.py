@@ -0,0 +1,159 @@
+import csv
+import io
+import json
+import os
+import zipfile
+import zlib
+
+import file_formats
+
+# Names of the summaries written alongside the processed files in a batch archive
+SUMMARY_NAME = "summary.json"
+ERROR_SUMMARY_NAME = "error_summary.csv"
+# Raised opening or reading a member that is corrupt, encrypted or compressed in a way zipfile can't read
+MEMBER_ERRORS = (zipfile.BadZipFile, zlib.error, EOFError, RuntimeError, NotImplementedError)
+
+
+def is_archive(filename):
+    return filename.lower().endswith(".zip")
+
+
+def unique_name(name, taken):
+    """
+    Gives same-named files (e.g. from different folders of an archive) names of their own:
+    "data.csv", "data (2).csv", ... Adds the name returned to taken.
+    """
+    stem, extension = os.path.splitext(name)
+    candidate, number = name, 1
+    while candidate.lower() in taken:
+        number += 1
+        candidate = f"{stem} ({number}){extension}"
+    taken.add(candidate.lower())
+    return candidate
+
+
+def archive_members(path, max_bytes, name=None):
+    """
+    Lists the data files in a zip archive.
+
+    :param path: Path of the archive.
+    :param max_bytes: Most the data files may expand to, so a small archive can't fill the disk.
+    :param name: Name of the archive in error messages, defaulting to its file name.
+    :return: A tuple of (ZipInfo of each data file, names of the entries left out).
+    :raises ValueError: If the archive is not a zip file or expands to more than max_bytes.
+    """
+    name = name or os.path.basename(path)
+    try:
+        with zipfile.ZipFile(path) as archive:
+            entries = archive.infolist()
+    except zipfile.BadZipFile as error:
+        raise ValueError(f"{name} is not a valid zip archive: {error}")
+    members, skipped = [], []
+    for info in entries:
+        member_name = os.path.basename(info.filename)
+        if info.is_dir():
+            continue
+        # Only files of a supported format; no hidden files or macOS resource forks
+        if (member_name.startswith(".") or info.filename.startswith("__MACOSX/")
+                or os.path.splitext(member_name)[1].lower() not in file_formats.EXTENSIONS):
+            skipped.append(info.filename)
+            continue
+        members.append(info)
+    if sum(info.file_size for info in members) > max_bytes:
+        raise ValueError(f"{name} expands to more than {max_bytes} bytes")
+    return members, skipped
+
+
+class MemberStream:
+    def __init__(self, member, name):
+        """
+        A binary stream of an archive member that raises ValueError for a member it can't read.
+
+        :param member: The stream from ZipFile.open.
+        :param name: The member's name in error messages.
+        """
+        self.member = member
+        self.name = name
+
+    def read(self, size=-1):
+        try:
+            return self.member.read(size)
+        except MEMBER_ERRORS as error:
+            raise ValueError(f"{self.name} could not be read: {error}")
+
+
+def open_members(path, members, name=None):
+    """
+    Yields each listed member of an archive with a binary stream of its contents.
+
+    :param name: Name of the archive in error messages, defaulting to its file name.
+    :raises ValueError: If a member is corrupt, encrypted or uses an unsupported compression.
+    """
+    name = name or os.path.basename(path)
+    with zipfile.ZipFile(path) as archive:
+        for info in members:
+            member_name = f"{info.filename} in {name}"
+            try:
+                member = archive.open(info)
+            except MEMBER_ERRORS as error:
+                raise ValueError(f"{member_name} could not be read: {error}")
+            with member:
+                yield info, MemberStream(member, member_name)
+
+
+def summarise(files, seconds):
+    """
+    Combines the results of a batch's files.
+
+    :param files: One dict per file: file, status ("done", "failed" or "skipped"), and for
+        processed files output, rows, seconds and errors (flagged values per field).
+    :param seconds: Wall-clock time the batch took, from the first file queued to the last done.
+    :return: A dict with the files, their total rows and errors per field, and the throughput.
+    """
+    done = [entry for entry in files if entry["status"] == "done"]
+    rows = sum(entry["rows"] for entry in done)
+    errors = {}
+    for entry in done:
+        for field, count in entry["errors"].items():
+            errors[field] = errors.get(field, 0) + count
+    return {
+        "files": files,
+        "processed": len(done),
+        "failed": sum(1 for entry in files if entry["status"] == "failed"),
+        "skipped": sum(1 for entry in files if entry["status"] == "skipped"),
+        "rows": rows,
+        "errors": errors,
+        "seconds": seconds,
+        "rows_per_second": rows / seconds if seconds else 0,
+    }
+
+
+def error_summary_csv(summary):
+    # One row per file with its rows and flagged values per field, then the batch totals
+    fields = sorted(summary["errors"])
+    text = io.StringIO()
+    writer = csv.writer(text)
+    writer.writerow(["File", "Status", "Rows"] + [f"{field.capitalize()} Errors" for field in fields])
+    for entry in summary["files"]:
+        counts = entry.get("errors") or {}
+        writer.writerow([entry["file"], entry["status"], entry.get("rows", "")]
+                        + [counts.get(field, "") if entry["status"] == "done" else "" for field in fields])
+    writer.writerow(["Total", "", summary["rows"]] + [summary["errors"][field] for field in fields])
+    return text.getvalue()
+
+
+def write_archive(path, outputs, summary):
+    """
+    Writes the processed files of a batch and its summaries into one zip archive.
+
+    :param path: Where to write the archive.
+    :param outputs: (name in the archive, path on disk) of each processed file.
+    :param summary: The batch summary from summarise.
+    """
+    partial_path = f"{path}.part"
+    with zipfile.ZipFile(partial_path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, output in outputs:
+            archive.write(output, name)
+        archive.writestr(SUMMARY_NAME, json.dumps(summary, indent=2))
+        archive.writestr(ERROR_SUMMARY_NAME, error_summary_csv(summary))
+    os.replace(partial_path, path)
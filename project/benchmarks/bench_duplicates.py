@@ -0,0 +1,57 @@
+"""
+Shows how cross-row duplicate detection scales with the number of rows.
+
+Run from the app directory:  python -m benchmarks.bench_duplicates [--rows 10000 100000 1000000]
+"""
+import argparse
+import math
+import sys
+import time
+
+from benchmarks.synthetic import generate
+from duplicates import find_duplicates
+
+# Synthetic column each compared field is taken from
+FIELDS = {
+    "name": "Name",
+    "surname": "Surname",
+    "email": "Email",
+    "phone": "Phone",
+    "postcode": "Postcode",
+    "address": "Street Address 1",
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--max-exponent", type=float, default=1.5,
+                        help="fail if time grows faster than rows ** this between sizes")
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'seconds':>9} {'rows/s':>10} {'pairs':>12} {'pairs/row':>10} {'all pairs':>16} {'exponent':>9}")
+    previous = None
+    worst = 0.0
+    for rows in sorted(args.rows):
+        file_data = generate(rows, seed=rows)
+        fields = {field: file_data[column] for field, column in FIELDS.items()}
+        start = time.perf_counter()
+        clusters, scores, pair_count = find_duplicates(fields)
+        elapsed = time.perf_counter() - start
+        # Growth of time against growth of rows since the previous size: 1 is linear, 2 quadratic
+        exponent = ""
+        if previous:
+            growth = math.log(elapsed / previous[1]) / math.log(rows / previous[0])
+            worst = max(worst, growth)
+            exponent = f"{growth:.2f}"
+        print(f"{rows:>10} {elapsed:>9.2f} {rows / elapsed:>10.0f} {pair_count:>12} {pair_count / rows:>10.1f} "
+              f"{rows * (rows - 1) // 2:>16} {exponent:>9}")
+        previous = (rows, elapsed)
+
+    if worst > args.max_exponent:
+        print(f"Scaling exponent {worst:.2f} is above {args.max_exponent}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
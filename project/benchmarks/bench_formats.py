@@ -0,0 +1,100 @@
+"""
+Compares end-to-end DataCleanse time and peak memory for CSV and Parquet files.
+
+Run from the app directory:  python -m benchmarks.bench_formats [--rows 200000] [--repeat 3]
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import file_formats
+from benchmarks.memory import peak_rss_kb
+from benchmarks.synthetic import write_csv
+
+
+def cleanse_once(work_dir, source):
+    # Runs in a fresh process, so the peak is that of this one read-cleanse-write alone
+    os.chdir(work_dir)
+    from WebApp import DataCleanse
+    baseline = peak_rss_kb()
+    start = time.perf_counter()
+    data_cleanse = DataCleanse(source)
+    elapsed = time.perf_counter() - start
+    peak = peak_rss_kb()
+    return elapsed, baseline, peak, os.path.abspath(data_cleanse.output_path)
+
+
+def read_output(path):
+    if path.endswith(".csv"):
+        return pd.read_csv(path, dtype=str, keep_default_na=False)
+    return pd.read_parquet(path).astype(object)
+
+
+def check_conversions(output, work_dir, rows=1000):
+    # Converts the first rows of a processed CSV to every format and reads each back, as the
+    # download links on the preview page do; True when all of them hold the same text
+    sample = os.path.join(work_dir, "conversion.csv")
+    pd.read_csv(output, dtype=str, keep_default_na=False, nrows=rows).to_csv(sample, index=False, quoting=1)
+    expected = read_output(sample)
+    all_same = True
+    for file_format in file_formats.FORMAT_EXTENSIONS:
+        converted = file_formats.convert(sample, file_format)
+        # Excel reads blank cells back as missing
+        same = file_formats.read_frame(converted).astype(object).fillna("").equals(expected)
+        print(f"Converts to {file_format}: {same}")
+        all_same = all_same and same
+    return all_same
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    # Work in a scratch directory so the app's processed folder is left alone
+    app_dir = os.getcwd()
+    work_dir = tempfile.mkdtemp(prefix="bench_formats_")
+    os.makedirs(os.path.join(work_dir, "processed"), exist_ok=True)
+    # Spawned workers start clean rather than inheriting this process's memory
+    context = multiprocessing.get_context("spawn")
+    sys.path.insert(0, app_dir)
+    try:
+        csv_source = write_csv(os.path.join(work_dir, "synthetic.csv"), args.rows, seed=args.rows)
+        parquet_source = os.path.join(work_dir, "synthetic.parquet")
+        pd.read_csv(csv_source).to_parquet(parquet_source, index=False)
+
+        print(f"{args.rows} rows, best of {args.repeat}")
+        print(f"{'format':>8} {'input MB':>9} {'seconds':>9} {'rows/s':>10} {'peak RSS MB':>12} {'over import MB':>15}")
+        outputs = {}
+        for name, source in [("csv", csv_source), ("parquet", parquet_source)]:
+            runs = []
+            for _ in range(args.repeat):
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    runs.append(executor.submit(cleanse_once, work_dir, source).result())
+            elapsed = min(run[0] for run in runs)
+            peak = min(run[2] for run in runs) / 1024
+            growth = min(run[2] - run[1] for run in runs) / 1024
+            outputs[name] = runs[0][3]
+            size = os.path.getsize(source) / (1024 * 1024)
+            print(f"{name:>8} {size:>9.1f} {elapsed:>9.2f} {args.rows / elapsed:>10.0f} {peak:>12.1f} {growth:>15.1f}")
+
+        identical = read_output(outputs["csv"]).equals(read_output(outputs["parquet"]))
+        print(f"Same cleansed data from both formats: {identical}")
+        converts = check_conversions(outputs["csv"], work_dir)
+        if not identical or not converts:
+            sys.exit(1)
+    finally:
+        os.chdir(app_dir)
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Compares DataCleanse time and memory with and without memory-optimized (compact column) mode.
+
+Run from the app directory:  python -m benchmarks.bench_memory [--rows 200000] [--repeat 3]
+"""
+import argparse
+import filecmp
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks.memory import peak_rss_kb
+from benchmarks.synthetic import write_csv
+
+
+def cleanse_once(work_dir, source, memory_optimized):
+    # Runs in a fresh process, so the peak is that of this one read-cleanse-write alone
+    os.chdir(work_dir)
+    from WebApp import DataCleanse
+    baseline = peak_rss_kb()
+    start = time.perf_counter()
+    data_cleanse = DataCleanse(source, memory_optimized=memory_optimized)
+    elapsed = time.perf_counter() - start
+    peak = peak_rss_kb()
+    # Each mode keeps its own copy of the output for the comparison at the end
+    output = f"{data_cleanse.output_path}.{'compact' if memory_optimized else 'object'}"
+    shutil.copyfile(data_cleanse.output_path, output)
+    return elapsed, baseline, peak, os.path.abspath(output), data_cleanse.memory_report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    # Work in a scratch directory so the app's processed folder is left alone
+    app_dir = os.getcwd()
+    work_dir = tempfile.mkdtemp(prefix="bench_memory_")
+    os.makedirs(os.path.join(work_dir, "processed"), exist_ok=True)
+    # Spawned workers start clean rather than inheriting this process's memory
+    context = multiprocessing.get_context("spawn")
+    sys.path.insert(0, app_dir)
+    try:
+        source = write_csv(os.path.join(work_dir, "synthetic.csv"), args.rows, seed=args.rows)
+
+        print(f"{args.rows} rows, best of {args.repeat}")
+        print(f"{'mode':>10} {'seconds':>9} {'rows/s':>10} {'peak RSS MB':>12} {'over import MB':>15}")
+        outputs = {}
+        report = None
+        for name, memory_optimized in [("object", False), ("compact", True)]:
+            runs = []
+            for _ in range(args.repeat):
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    runs.append(executor.submit(cleanse_once, work_dir, source, memory_optimized).result())
+            elapsed = min(run[0] for run in runs)
+            peak = min(run[2] for run in runs) / 1024
+            growth = min(run[2] - run[1] for run in runs) / 1024
+            outputs[name] = runs[0][3]
+            report = runs[0][4] or report
+            print(f"{name:>10} {elapsed:>9.2f} {args.rows / elapsed:>10.0f} {peak:>12.1f} {growth:>15.1f}")
+
+        print(f"Loaded frame: {report['before'] / 2 ** 20:.1f} MB as objects, {report['after'] / 2 ** 20:.1f} MB "
+              f"compacted ({report['saved'] / report['before']:.0%} saved)")
+        print(f"Categorical columns: {', '.join(report['categorical'])}")
+        identical = filecmp.cmp(outputs["object"], outputs["compact"], shallow=False)
+        print(f"Same output from both modes: {identical}")
+        if not identical:
+            sys.exit(1)
+    finally:
+        os.chdir(app_dir)
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Measures DataCleanse throughput as the number of partition workers grows.
+
+Run from the app directory:  python -m benchmarks.bench_parallel [--rows 200000] [--workers 1 2 4 8]
+"""
+import argparse
+import filecmp
+import os
+import shutil
+import tempfile
+import time
+
+import WebApp
+from WebApp import DataCleanse
+from benchmarks.synthetic import write_csv
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    # Work in a scratch directory so the app's processed folder is left alone
+    app_dir = os.getcwd()
+    work_dir = tempfile.mkdtemp(prefix="bench_parallel_")
+    os.chdir(work_dir)
+    os.makedirs(WebApp.PROCESSED_FOLDER, exist_ok=True)
+    try:
+        source = write_csv(os.path.join(work_dir, "synthetic.csv"), args.rows, seed=args.rows)
+        processed = os.path.join(WebApp.PROCESSED_FOLDER, "synthetic.csv")
+        baseline = os.path.join(work_dir, "serial.csv")
+
+        print(f"{args.rows} rows, {os.cpu_count()} CPUs")
+        print(f"{'workers':>7} {'seconds':>9} {'rows/s':>10} {'speedup':>8}  identical")
+        serial_time = None
+        for workers in args.workers:
+            start = time.perf_counter()
+            DataCleanse(source, workers=workers)
+            elapsed = time.perf_counter() - start
+            if serial_time is None:
+                serial_time = elapsed
+                shutil.copy(processed, baseline)
+            identical = filecmp.cmp(processed, baseline, shallow=False)
+            print(f"{workers:>7} {elapsed:>9.2f} {args.rows / elapsed:>10.0f} {serial_time / elapsed:>7.2f}x  {identical}")
+    finally:
+        os.chdir(app_dir)
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Compares the stage pipeline, which re-runs repeated stages over the columns that may have changed,
+against running every stage over every column.
+
+Checks both give the same output on Test_Data.csv, synthetic files (also with phone numbers in
+the name columns, which the phone passes swap back and forth) and files whose values turn up in
+any column, then times them.
+Run from the app directory:  python -m benchmarks.bench_pipeline [--sizes 10000 100000]
+"""
+import argparse
+import os
+import time
+
+import pandas as pd
+
+from WebApp import DataCleanse
+from benchmarks.synthetic import generate, generate_mixed
+
+TEST_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Test_Data.csv")
+
+
+def misplaced_phones(rows, seed=0):
+    # Valid phone numbers in the name columns as well as the phone column: the first phone pass
+    # swaps them, and the second swaps them back. Without a landline column no stage in between
+    # writes the name columns, so only the phone pass's own swaps mark them for the second pass.
+    file_data = generate(rows, seed).drop(columns=["Landline"])
+    file_data.loc[::7, "Name"] = "123 45678901"
+    file_data.loc[3::11, "Surname"] = "456 12345678"
+    return file_data
+
+
+def full_passes(cleanse, file_data):
+    # Every stage in order over the whole frame, as the cleanse ran before the pipeline
+    for stage in DataCleanse.PIPELINE.stages:
+        getattr(cleanse, stage.name)(file_data)
+        cleanse.relocated_columns.clear()
+    return file_data
+
+
+def pipeline(cleanse, file_data):
+    return cleanse.cleanse(file_data)
+
+
+def run(method, source):
+    cleanse = DataCleanse()
+    file_data = cleanse.normalise_file_data(source.copy())
+    start = time.perf_counter()
+    file_data = method(cleanse, file_data)
+    return file_data, time.perf_counter() - start
+
+
+def compare(label, source):
+    full, full_time = run(full_passes, source)
+    piped, piped_time = run(pipeline, source)
+    same = full.astype(str).equals(piped.astype(str))
+    print(f"{label:>16} {len(source):>9} {full_time:>10.3f} {piped_time:>10.3f} "
+          f"{full_time / piped_time:>7.1f}x  {same}")
+    return same
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    args = parser.parse_args()
+
+    print(f"{'data':>16} {'rows':>9} {'full s':>10} {'pipeline s':>10} {'speedup':>8}  same")
+    results = [compare("Test_Data.csv", pd.read_csv(TEST_DATA))]
+    for rows in args.sizes:
+        results.append(compare("synthetic", generate(rows, seed=rows)))
+        results.append(compare("phones in names", misplaced_phones(rows, seed=rows)))
+        results.append(compare("mixed", generate_mixed(rows, seed=rows)))
+    if not all(results):
+        raise SystemExit("Pipeline output differs from running every stage over every column")
+
+
+if __name__ == "__main__":
+    main()
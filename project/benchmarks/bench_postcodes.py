@@ -0,0 +1,66 @@
+"""
+Compares postcode-to-country inference by shape index against trying every country's pattern.
+
+Run from the app directory:  python -m benchmarks.bench_postcodes [--rows 200000]
+"""
+import argparse
+import random
+import sys
+import time
+
+import pandas as pd
+
+from postcode_matcher import POSTCODE_SHAPES, PostcodeMatcher, normalise_postcode
+
+
+def random_postcodes(rows, seed=0):
+    # Fills in a random shape of a random country, so some values are valid and many are not
+    rng = random.Random(seed)
+    shapes = [shape for country_shapes in POSTCODE_SHAPES.values() for shape in country_shapes]
+    fill = {"A": "ABCDEFGHJKLMNPRSTUVWXYZ", "9": "0123456789"}
+    postcodes = []
+    for _ in range(rows):
+        postcode = "".join(rng.choice(fill[char]) if char in fill else char for char in rng.choice(shapes))
+        postcodes.append(postcode.lower() if rng.random() < 0.2 else postcode)
+    return pd.Series(postcodes)
+
+
+def match_every_pattern(matcher, postcode):
+    # The approach the index replaces: every country's pattern tried in turn
+    postcode = normalise_postcode(postcode)
+    return [iso_code for iso_code, pattern in matcher.postcode_patterns.items() if pattern.match(postcode)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    args = parser.parse_args()
+
+    matcher = PostcodeMatcher()
+    postcodes = random_postcodes(args.rows, seed=args.rows)
+    print(f"{args.rows} postcodes ({postcodes.nunique()} distinct), {len(matcher.postcode_patterns)} countries")
+
+    start = time.perf_counter()
+    scanned = [match_every_pattern(matcher, postcode) for postcode in postcodes]
+    scan_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    indexed = [matcher.match_postcode_to_isos(postcode) for postcode in postcodes]
+    index_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    series = matcher.match_series(postcodes)
+    series_time = time.perf_counter() - start
+
+    print(f"{'method':>16} {'seconds':>9} {'postcodes/s':>12}")
+    for name, elapsed in [("every pattern", scan_time), ("shape index", index_time), ("match_series", series_time)]:
+        print(f"{name:>16} {elapsed:>9.2f} {args.rows / elapsed:>12.0f}")
+
+    identical = indexed == scanned and [list(countries) for countries in series] == scanned
+    print(f"Same countries from every method: {identical}")
+    if not identical:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Compares the vectorized column relocation against the original per-cell loop.
+
+Run from the app directory:  python -m benchmarks.bench_relocation [--sizes 10000 100000 1000000]
+"""
+import argparse
+import time
+
+from WebApp import DataCleanse
+from benchmarks.synthetic import generate
+from validators import validators
+
+# Field validated -> column the values belong in
+FIELDS = {
+    "phone": "Phone",
+    "landline": "Landline",
+    "postcode": "Postcode",
+    "email": "Email",
+}
+
+
+def legacy_process_all_rows(file_data, field, expected_col_idx):
+    # The original iterrows/swap_col_data implementation, kept here as the reference
+    def valid(value):
+        return validators.is_valid(field, value)
+
+    for row_idx, row in file_data.iterrows():
+        for col_idx, column in enumerate(file_data.columns):
+            if valid(str(row[column])) and col_idx != expected_col_idx:
+                src_col_data = file_data.iloc[row_idx, col_idx]
+                des_col_data = file_data.iloc[row_idx, expected_col_idx]
+                file_data.iloc[row_idx, expected_col_idx] = src_col_data
+                file_data.iloc[row_idx, col_idx] = des_col_data
+
+
+def time_call(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--max-legacy-rows", type=int, default=100_000,
+                        help="Skip the legacy loop above this many rows (it takes minutes per field)")
+    args = parser.parse_args()
+
+    cleanse = DataCleanse()
+    print(f"{'rows':>9} {'field':>9} {'legacy s':>10} {'vector s':>10} {'speedup':>8}  same")
+    for rows in args.sizes:
+        source = generate(rows, seed=rows)
+        for field, column in FIELDS.items():
+            col_idx = source.columns.get_loc(column)
+            vectorized = source.copy()
+            vector_time = time_call(cleanse.process_all_rows, vectorized, field, col_idx)
+
+            if rows > args.max_legacy_rows:
+                print(f"{rows:>9} {field:>9} {'-':>10} {vector_time:>10.3f} {'-':>8}  -")
+                continue
+            legacy = source.copy()
+            legacy_time = time_call(legacy_process_all_rows, legacy, field, col_idx)
+            same = legacy.equals(vectorized)
+            print(f"{rows:>9} {field:>9} {legacy_time:>10.3f} {vector_time:>10.3f} "
+                  f"{legacy_time / vector_time:>7.1f}x  {same}")
+
+
+if __name__ == "__main__":
+    main()
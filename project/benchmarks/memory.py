@@ -0,0 +1,18 @@
+import resource
+
+
+def peak_rss_kb():
+    """
+    Peak resident memory of this process so far, in kilobytes.
+
+    VmHWM belongs to this process's own address space; ru_maxrss would also carry over
+    the peak of the parent that launched it, which survives exec on Linux.
+    """
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
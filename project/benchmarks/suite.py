@@ -0,0 +1,183 @@
+"""
+Times every DataCleanse stage and the whole pipeline on synthetic files, and checks for regressions.
+
+Run from the app directory:
+    python -m benchmarks.suite [--rows 10000 100000] [--repeat 3] [--output results.json]
+                               [--profile profiles/] [--compare baseline.json] [--threshold 0.15]
+
+Each run cleanses a generated file in a fresh process, so peak memory belongs to that run alone.
+Results are saved as JSON; --compare diffs them against an earlier results file and exits with
+status 1 if the total time, peak memory or any stage slowed down by more than the threshold.
+--profile writes a cProfile dump per run (open it with snakeviz, or turn it into a flamegraph
+with flameprof or gprof2dot).
+"""
+import argparse
+import cProfile
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from benchmarks.memory import peak_rss_kb
+from benchmarks.synthetic import write_csv
+
+# Stages faster than this in the baseline are too noisy to flag
+MIN_STAGE_SECONDS = 0.05
+
+
+def cleanse_once(work_dir, source, profile_path=None):
+    # Runs in a fresh process; returns the run's timings and peak memory
+    os.chdir(work_dir)
+    from WebApp import DataCleanse
+    baseline = peak_rss_kb()
+    profiler = cProfile.Profile() if profile_path else None
+    start = time.perf_counter()
+    if profiler:
+        profiler.enable()
+    data_cleanse = DataCleanse(source)
+    if profiler:
+        profiler.disable()
+    elapsed = time.perf_counter() - start
+    peak = peak_rss_kb()
+    if profiler:
+        profiler.dump_stats(profile_path)
+    return {
+        "total_seconds": elapsed,
+        "peak_rss_kb": peak,
+        "rss_growth_kb": peak - baseline,
+        "stages": stage_timings(data_cleanse.stage_report),
+    }
+
+
+def stage_timings(stage_report):
+    # Seconds and frame memory change per stage; stages that run more than once are numbered,
+    # e.g. "process_phone (2)"
+    stages = {}
+    runs = {}
+    for entry in stage_report:
+        name = entry["stage"]
+        runs[name] = runs.get(name, 0) + 1
+        if runs[name] > 1:
+            name = f"{name} ({runs[name]})"
+        stages[name] = {"seconds": entry["seconds"], "memory_delta": entry["memory_delta"]}
+    return stages
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def run_suite(sizes, repeat, profile_dir):
+    # Work in a scratch directory so the app's processed folder is left alone
+    work_dir = tempfile.mkdtemp(prefix="bench_suite_")
+    os.makedirs(os.path.join(work_dir, "processed"), exist_ok=True)
+    # Spawned workers start clean rather than inheriting this process's memory
+    context = multiprocessing.get_context("spawn")
+    runs = {}
+    try:
+        for rows in sizes:
+            source = write_csv(os.path.join(work_dir, f"synthetic_{rows}.csv"), rows, seed=rows)
+            best = None
+            for attempt in range(repeat):
+                profile_path = None
+                if profile_dir:
+                    profile_path = os.path.abspath(os.path.join(profile_dir, f"cleanse_{rows}_{attempt + 1}.prof"))
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    run = executor.submit(cleanse_once, work_dir, source, profile_path).result()
+                # Keep the fastest attempt; the slower ones mostly measure noise
+                if best is None or run["total_seconds"] < best["total_seconds"]:
+                    best = run
+            best["rows"] = rows
+            best["rows_per_second"] = rows / best["total_seconds"]
+            runs[str(rows)] = best
+            print(f"\n{rows} rows: {best['total_seconds']:.2f}s, {best['rows_per_second']:.0f} rows/s, "
+                  f"peak {best['peak_rss_kb'] / 1024:.1f} MB")
+            for stage, timing in best["stages"].items():
+                print(f"  {stage:<32} {timing['seconds']:>8.3f}s {timing['memory_delta'] / 1024:>10.1f} KB")
+    finally:
+        shutil.rmtree(work_dir)
+    return runs
+
+
+def compare(baseline, results, threshold):
+    """
+    Prints the change of every metric against the baseline.
+
+    :return: Descriptions of the metrics that got worse by more than the threshold.
+    """
+    regressions = []
+    print(f"\n{'rows':>9} {'metric':<32} {'baseline':>10} {'current':>10} {'change':>8}")
+    for rows, run in results["runs"].items():
+        base = baseline["runs"].get(rows)
+        if base is None:
+            continue
+        metrics = [("total_seconds", base["total_seconds"], run["total_seconds"]),
+                   ("peak_rss_kb", base["peak_rss_kb"], run["peak_rss_kb"])]
+        metrics += [(f"stage {stage}", timing["seconds"], run["stages"].get(stage, {}).get("seconds"))
+                    for stage, timing in base["stages"].items() if timing["seconds"] >= MIN_STAGE_SECONDS]
+        for metric, before, after in metrics:
+            if after is None or not before:
+                continue
+            change = after / before - 1
+            flag = " <-" if change > threshold else ""
+            print(f"{rows:>9} {metric:<32} {before:>10.3f} {after:>10.3f} {change:>+7.1%}{flag}")
+            if flag:
+                regressions.append(f"{metric} at {rows} rows: {change:+.1%}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default="benchmark_results.json", help="where to save the results")
+    parser.add_argument("--profile", metavar="DIR", help="write a cProfile dump of every run to DIR")
+    parser.add_argument("--compare", metavar="BASELINE", help="results JSON of an earlier run to diff against")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="slowdown (as a fraction) above which a metric counts as a regression")
+    args = parser.parse_args()
+
+    # Spawned workers get this path too, so they import the app whatever their working directory
+    sys.path.insert(0, os.getcwd())
+    if args.profile:
+        os.makedirs(args.profile, exist_ok=True)
+
+    results = {"environment": environment(), "runs": run_suite(sorted(args.rows), args.repeat, args.profile)}
+    with open(args.output, "w") as output:
+        json.dump(results, output, indent=2)
+    print(f"Results saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(baseline, results, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions above {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Generates messy customer exports shaped like Test_Data.csv, for benchmarks.
+
+Run from the app directory:  python -m benchmarks.synthetic --rows 100000 [--seed 0] synthetic.csv
+"""
+import argparse
+import random
+
+import pandas as pd
+
+FIRST_NAMES = ["Jason", "Peter", "Tom", "Oliver", "Emma", "Liam", "Ava", "Noah", "Sophia", "James",
+               "Isabella", "Lucas", "Mia", "Benjamin", "Charlotte", "Elijah", "Amelia", "Henry"]
+SURNAMES = ["Statham", "Griffin", "Hanks", "Smith", "Johnson", "Williams", "Brown", "Jones",
+            "Garcia", "Miller", "Davis", "Rodriguez", "Martinez", "Hernandez", "Lopez", "Wilson"]
+UK_CITIES = ["London", "Manchester", "Glasgow", "Edinburgh", "Bristol", "Cardiff", "Belfast", "Leeds"]
+US_CITIES = ["Los Angeles", "Houston", "Phoenix", "Dallas", "Seattle", "Boston", "Chicago"]
+UK_POSTCODES = ["EC1A 1BB", "M1 1AE", "G2 8QD", "EH12 5PL", "BS1 5AH", "CF10 2BY", "BT1 5GB", "LS1 1AB"]
+US_ZIPS = ["90028", "77002", "30303", "75201", "98101", "02115", "60601"]
+UK_COUNTRIES = ["United Kingdom", "united kingdom", "UNITED KINGDOM", "GB", "GBR"]
+US_COUNTRIES = ["United States", "united states", "US", "USA"]
+PARENTS = ["SkyBridge Solutions", "Quantum Ventures", "FusionWorks Enterprises", "Green Horizon Industries",
+           "Apex Global Consulting", "SilverLeaf Corporation", "Zenith Consulting Group", "BlueWave Digital"]
+DOMAINS = ["gmail.com", "outlook.com", "yahoo.com", "aol.com", "icloud.com"]
+BAD_DOMAINS = ["gmailcom", "outlook,com", "gmail..com", "yahoo,.com", "icloudcom"]
+STREETS = ["Baker Street", "Manchester Road", "Sunset Blvd", "Elm Street", "Glasgow Way", "Bristol Crescent"]
+
+COLUMNS = ["ID", "Name", "Surname", "City", "Country", "Postcode", "Street Address 1", "Street Address 2",
+           "Parent", "Email", "Phone", "Landline"]
+
+
+def _email(rng, name, surname):
+    domain = rng.choice(BAD_DOMAINS) if rng.random() < 0.2 else rng.choice(DOMAINS)
+    return f"{name.lower()}{rng.choice(['.', '_'])}{surname.lower()}@{domain}"
+
+
+def _row(rng, idx):
+    name, surname = rng.choice(FIRST_NAMES), rng.choice(SURNAMES)
+    uk = rng.random() < 0.65
+    row = {
+        "ID": str(idx),
+        "Name": name + (" " if rng.random() < 0.1 else ""),
+        "Surname": surname + "  ",
+        "City": rng.choice(UK_CITIES if uk else US_CITIES) + ("  " if uk else ""),
+        "Country": rng.choice(UK_COUNTRIES if uk else US_COUNTRIES),
+        "Postcode": rng.choice(UK_POSTCODES if uk else US_ZIPS),
+        "Street Address 1": f"{rng.randint(1, 999)} {rng.choice(STREETS)}",
+        "Street Address 2": "",
+        "Parent": rng.choice(PARENTS),
+        "Email": _email(rng, name, surname),
+        "Phone": f"{rng.randint(100, 999)} {rng.randint(10000000, 99999999)}",
+        "Landline": f"{rng.randint(10, 99)} {rng.randint(10000, 99999)} {rng.randint(10000, 99999)}",
+    }
+
+    roll = rng.random()
+    if roll < 0.05:
+        row["ID"] = ""
+    elif roll < 0.1:
+        row["ID"] = f"{row['ID']}{rng.choice(['a', 'd', 'asd', '@'])}"
+    if rng.random() < 0.1:
+        row["Postcode"] = f"{row['Postcode']}, {rng.choice(UK_POSTCODES)}"
+    if rng.random() < 0.1:
+        row["Email"] = f"{row['Email']}{rng.choice([', ', ' '])}{_email(rng, name, surname)}"
+    if rng.random() < 0.1:
+        row["Parent"] = name
+    if rng.random() < 0.2:
+        row["Street Address 2"] = f"{rng.randint(1, 999)} {rng.choice(STREETS)}"
+    if rng.random() < 0.1:
+        row["Street Address 1"], row["Street Address 2"] = "", row["Street Address 1"]
+
+    # Shifted columns: values landing one or two fields away from where they belong
+    roll = rng.random()
+    if roll < 0.05:
+        row["Postcode"], row["Street Address 2"] = row["Street Address 2"], row["Postcode"]
+    elif roll < 0.1:
+        row["Phone"], row["Landline"] = row["Landline"], row["Phone"]
+    elif roll < 0.13:
+        row["Email"], row["Parent"] = row["Parent"], row["Email"]
+    return row
+
+
+def generate(rows, seed=0):
+    """
+    Builds a messy customer export shaped like Test_Data.csv.
+
+    :param rows: Number of rows to generate.
+    :param seed: Seed for the random generator, so runs are reproducible.
+    :return: A DataFrame with the raw (uncleaned) columns.
+    """
+    rng = random.Random(seed)
+    return pd.DataFrame([_row(rng, idx) for idx in range(1, rows + 1)], columns=COLUMNS)
+
+
+# Values of every kind, for files where any value may turn up in any column
+MIXED_VALUES = ["123 45678901", "456 12345678", "(555) 123-4567", "555.123.4567", "12 12345 12345", "M1 1AE",
+                "ec1a 1bb", "90210", "77002-1234", "a@b.com", "x@y.org, z@w.com", "a@b.com c@d.com", "bad@",
+                "foo bar@baz.com", "", "nan", "United Kingdom", "uk", "France", "junk", "Smith", "Tom",
+                "1 Road", " spaced  "]
+
+
+def generate_mixed(rows, seed=0):
+    """
+    Builds an export whose cells are drawn from MIXED_VALUES regardless of column, so values
+    are relocated back and forth between columns, e.g. two valid phone numbers in one row.
+
+    :return: A DataFrame with the raw (uncleaned) columns.
+    """
+    rng = random.Random(seed)
+    return pd.DataFrame([[rng.choice(MIXED_VALUES) for _ in COLUMNS] for _ in range(rows)], columns=COLUMNS)
+
+
+def write_csv(path, rows, seed=0):
+    generate(rows, seed).to_csv(path, index=False)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("path")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    write_csv(args.path, args.rows, args.seed)
+    print(f"Wrote {args.rows} rows to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
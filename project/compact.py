@@ -0,0 +1,120 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Text columns with at most this many distinct values per non-blank cell become categoricals
+CATEGORY_MAX_RATIO = 0.5
+
+
+def text_dtype():
+    # Arrow-backed strings with NaN for missing cells, so str(value) and the stages' "nan"
+    # handling behave as they do on object columns; None when pyarrow isn't installed or pandas
+    # predates the na_value argument (2.3), which raises TypeError
+    try:
+        return pd.StringDtype("pyarrow", na_value=np.nan)
+    except (ImportError, TypeError, ValueError):
+        return None
+
+
+def as_text(values):
+    """
+    The text of every value, as str(value) gives it, whatever the column's dtype.
+
+    astype(str) leaves the missing cells of Arrow-backed string columns as NaN where an
+    object column would give "nan"; those are filled in to match.
+    """
+    text = values.astype(str)
+    return text.fillna("nan") if text.hasnans else text
+
+
+def trim_text(file_data):
+    """
+    Strips surrounding whitespace from every string cell, one vectorized pass per text column,
+    leaving numbers and missing cells as they are.
+    """
+    for position, dtype in enumerate(file_data.dtypes):
+        if dtype != object:
+            continue
+        column = file_data.iloc[:, position]
+        if pd.api.types.infer_dtype(column, skipna=True) == "string":
+            file_data.isetitem(position, column.str.strip())
+        else:
+            # Strings mixed with other values: .str would turn the others into NaN
+            file_data.isetitem(position, column.map(lambda x: x.strip() if isinstance(x, str) else x))
+    return file_data
+
+
+def map_categories(column, func):
+    """
+    Applies func to each category of a categorical Series once, rather than to every row.
+
+    :param column: A categorical Series.
+    :param func: Function taking a category and returning its new value; categories mapped
+        to the same value are merged.
+    :return: A categorical Series with the mapped values; missing cells stay missing.
+    """
+    mapped = pd.Index([func(category) for category in column.cat.categories], dtype=object)
+    new_codes, categories = pd.factorize(mapped)
+    codes = column.cat.codes.to_numpy()
+    codes = np.where(codes >= 0, new_codes[codes], -1)
+    return pd.Series(pd.Categorical.from_codes(codes, categories=categories), index=column.index, name=column.name)
+
+
+def with_blank_category(column):
+    # A categorical column can only be set to "" once "" is one of its categories
+    return column if "" in column.cat.categories else column.cat.add_categories("")
+
+
+def fill_blank_categories(column):
+    # "" for missing cells and "nan" text, as fill_blanks does for other columns. The blank is
+    # kept as a category even when unused, so later fillna("") calls don't fail on the column.
+    column = map_categories(column, lambda category: "" if category == "nan" else category)
+    return with_blank_category(column).fillna("")
+
+
+def compact_frame(file_data, keep_text=()):
+    """
+    Converts text columns to compact dtypes in place: low-cardinality ones to categoricals,
+    the rest to Arrow-backed strings (left as they are where those are unavailable, see text_dtype).
+
+    :param file_data: The normalised DataFrame.
+    :param keep_text: Columns never made categorical, e.g. those stages write new values into.
+    :return: A dict of the frame's memory before and after (bytes), and the converted columns.
+    """
+    before = int(file_data.memory_usage(deep=True).sum())
+    string_dtype = text_dtype()
+    categorical, text = [], []
+    for position, dtype in enumerate(file_data.dtypes):
+        if dtype != object:
+            continue
+        column = file_data.iloc[:, position]
+        name = file_data.columns[position]
+        if pd.api.types.infer_dtype(column, skipna=True) != "string":
+            continue
+        present = column.count()
+        if name not in keep_text and present and column.nunique() <= CATEGORY_MAX_RATIO * present:
+            file_data.isetitem(position, column.astype("category"))
+            categorical.append(name)
+        elif string_dtype is not None:
+            file_data.isetitem(position, column.astype(string_dtype))
+            text.append(name)
+    after = int(file_data.memory_usage(deep=True).sum())
+    if string_dtype is None:
+        logger.info("Arrow-backed strings are unavailable; only low-cardinality columns were compacted")
+    return {"before": before, "after": after, "saved": before - after, "categorical": categorical, "text": text}
+
+
+def merge_memory_reports(reports):
+    """
+    Adds up the compaction reports of several frames (e.g. the chunks of one file).
+    """
+    reports = [report for report in reports if report]
+    if not reports:
+        return None
+    merged = {key: sum(report[key] for report in reports) for key in ["before", "after", "saved"]}
+    for key in ["categorical", "text"]:
+        merged[key] = list(dict.fromkeys(column for report in reports for column in report[key]))
+    return merged
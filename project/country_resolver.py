@@ -0,0 +1,92 @@
+import pandas as pd
+import pycountry
+
+from compact import map_categories
+
+# Raw values whose result is kept; long-lived workers would otherwise keep every spelling they ever saw
+COUNTRY_CACHE_SIZE = 10000
+
+# Country fields pycountry.countries.lookup matches against, in the same order
+LOOKUP_FIELDS = ["alpha_2", "alpha_3", "numeric", "name", "official_name", "common_name"]
+
+# Common spellings pycountry does not know about
+ALIASES = {
+    "uk": "GBR",
+    "great britain": "GBR",
+    "england": "GBR",
+    "scotland": "GBR",
+    "wales": "GBR",
+    "northern ireland": "GBR",
+    "u.k.": "GBR",
+    "u.s.": "USA",
+    "u.s.a.": "USA",
+    "america": "USA",
+}
+
+
+def normalise_country(value):
+    return " ".join(value.split()).casefold()
+
+
+class CountryResolver:
+    def __init__(self):
+        """
+        Resolves country names, codes and aliases to ISO-3 codes from an index built once.
+        """
+        self.index = {}
+        for field in LOOKUP_FIELDS:
+            for country in pycountry.countries:
+                value = getattr(country, field, None)
+                if value:
+                    self.index.setdefault(normalise_country(value), country.alpha_3)
+        for alias, iso_code in ALIASES.items():
+            self.index.setdefault(alias, iso_code)
+        # Results per raw value, including misses (None)
+        self.cache = {}
+        self.hits = 0
+        self.misses = 0
+
+    def resolve(self, country_name):
+        """
+        Returns the ISO-3 code for a country name or code.
+
+        :param country_name: The value to resolve.
+        :return: The ISO-3 code, or None if the value is not a known country.
+        """
+        if country_name in self.cache:
+            self.hits += 1
+            return self.cache[country_name]
+        self.misses += 1
+        iso_code = self.index.get(normalise_country(country_name)) if isinstance(country_name, str) else None
+        if len(self.cache) >= COUNTRY_CACHE_SIZE:
+            # Drop the oldest value; dicts keep insertion order
+            del self.cache[next(iter(self.cache))]
+        self.cache[country_name] = iso_code
+        return iso_code
+
+    def resolve_series(self, countries):
+        """
+        Resolves a column of country values, looking up each distinct value once.
+
+        :param countries: A pandas Series of country values.
+        :return: A tuple of (Series with resolved values replaced by their ISO-3 code,
+                 dict of unresolved value -> number of rows).
+        """
+        present = countries.dropna()
+        distinct = present.unique()
+        resolved = {value: self.resolve(value) for value in distinct}
+        unresolved_values = [value for value, iso_code in resolved.items() if iso_code is None]
+        unresolved = present[present.isin(unresolved_values)].value_counts(sort=False)
+        # A categorical column also counts categories no row uses any more
+        unresolved = unresolved[unresolved > 0].to_dict()
+        if isinstance(countries.dtype, pd.CategoricalDtype):
+            # Categories are converted in place of the rows, keeping the column categorical
+            return map_categories(countries, lambda value: resolved.get(value) or value), unresolved
+        iso_codes = countries.map(resolved)
+        return countries.where(iso_codes.isna(), iso_codes), unresolved
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "cached_values": len(self.cache)}
+
+
+country_resolver = CountryResolver()
@@ -0,0 +1,181 @@
+import numpy as np
+import pandas as pd
+
+# How much agreement on each field counts towards two rows being the same customer
+FIELD_WEIGHTS = {"email": 3, "phone": 3, "name": 2, "surname": 2, "postcode": 2, "address": 2}
+# Emails that differ only after the "@" (usually a mistyped domain) earn this share of the email weight
+EMAIL_LOCAL_PART_CREDIT = 0.5
+# Share of the compared weight two rows must agree on to be linked as duplicates
+DUPLICATE_THRESHOLD = 0.75
+# Rows must share at least this much comparable weight, so two sparse rows don't match on one field
+MIN_COMPARED_WEIGHT = 6
+# Blocking keys: rows are only compared with rows sharing one of these keys
+BLOCKING_KEYS = ["postcode", "email_domain", "surname_sound"]
+# Within a block, rows sorted by name and email are compared with this many following rows, so a
+# block shared by many rows (a common email domain, say) costs O(n * window) rather than O(n^2)
+BLOCK_WINDOW = 8
+
+SOUNDEX_CODES = {letter: str(code) for code, letters in enumerate(
+    ["aeiouyhw", "bfpv", "cgjkqsxz", "dt", "l", "mn", "r"]) for letter in letters}
+
+
+def soundex(word):
+    """
+    Phonetic key of a word, so surnames that sound alike (Smith, Smyth) share a block.
+
+    :return: The four character Soundex code, or "" for a word without letters.
+    """
+    letters = [letter for letter in str(word).lower() if letter.isalpha()]
+    if not letters:
+        return ""
+    code = letters[0].upper()
+    previous = SOUNDEX_CODES.get(letters[0], "")
+    for letter in letters[1:]:
+        digit = SOUNDEX_CODES.get(letter, "")
+        if digit and digit != "0" and digit != previous:
+            code += digit
+        # h and w don't separate letters with the same code; vowels do
+        if letter not in "hw":
+            previous = digit
+    return (code + "000")[:4]
+
+
+def normalise_fields(fields):
+    """
+    Reduces each field to the form rows are compared on.
+
+    :param fields: Dict of field name (keys of FIELD_WEIGHTS) to a Series of cleansed values;
+        fields the file doesn't have may be left out.
+    :return: A DataFrame of normalised text, "" where a value is missing.
+    """
+    index = next(iter(fields.values())).index
+    blank = pd.Series("", index=index)
+    text = {name: fields.get(name, blank).fillna("").astype(str).str.strip().str.lower() for name in FIELD_WEIGHTS}
+    normalised = pd.DataFrame({
+        "name": text["name"].str.replace(r"\s+", " ", regex=True),
+        "surname": text["surname"].str.replace(r"\s+", " ", regex=True),
+        "email": text["email"],
+        # Digits only, dropping a float's ".0" and any country or trunk prefix
+        "phone": text["phone"].str.replace(r"\.0$", "", regex=True).str.replace(r"\D", "", regex=True).str[-10:],
+        "postcode": text["postcode"].str.upper().str.replace(r"[^0-9A-Z]", "", regex=True),
+        "address": text["address"].str.replace(r"[^0-9a-z]", "", regex=True),
+    }, index=index)
+    # Reindexed, as partition gives no columns at all for a frame without rows
+    emails = normalised["email"].str.partition("@").reindex(columns=[0, 1, 2], fill_value="")
+    normalised["email_local"] = emails[0].where(emails[1] != "", "")
+    normalised["email_domain"] = emails[2]
+    # Each distinct surname is encoded once
+    surnames = normalised["surname"]
+    normalised["surname_sound"] = surnames.map({surname: soundex(surname) for surname in surnames.unique()})
+    return normalised
+
+
+def codes(values):
+    # Integer code per distinct value, -1 for blanks, so comparisons run on numpy integers
+    codes, _ = pd.factorize(values.where(values != ""))
+    return codes
+
+
+def candidate_pairs(block_codes, sort_codes, window):
+    """
+    Pairs each row with the next window - 1 rows of its block, in sort order.
+
+    :return: Two arrays of row positions (first always the smaller).
+    """
+    rows = np.flatnonzero(block_codes >= 0)
+    rows = rows[np.lexsort((sort_codes[rows], block_codes[rows]))]
+    blocks = block_codes[rows]
+    left, right = [], []
+    for offset in range(1, window):
+        same_block = blocks[:-offset] == blocks[offset:]
+        left.append(rows[:-offset][same_block])
+        right.append(rows[offset:][same_block])
+    if not left:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    left, right = np.concatenate(left), np.concatenate(right)
+    return np.minimum(left, right), np.maximum(left, right)
+
+
+def score_pairs(field_codes, left, right):
+    """
+    Scores each candidate pair by the share of the weight of fields present in both rows that agree.
+
+    :return: The scores, and the weight that was compared for each pair.
+    """
+    matched = np.zeros(len(left))
+    compared = np.zeros(len(left))
+    for name, weight in FIELD_WEIGHTS.items():
+        a, b = field_codes[name][left], field_codes[name][right]
+        both = (a >= 0) & (b >= 0)
+        compared += weight * both
+        agree = both & (a == b)
+        if name == "email":
+            local_a, local_b = field_codes["email_local"][left], field_codes["email_local"][right]
+            partial = both & ~agree & (local_a >= 0) & (local_a == local_b)
+            matched += weight * EMAIL_LOCAL_PART_CREDIT * partial
+        matched += weight * agree
+    scores = np.divide(matched, compared, out=np.zeros(len(left)), where=compared > 0)
+    return scores, compared
+
+
+def connected_clusters(row_count, left, right):
+    """
+    Groups rows joined by links into clusters.
+
+    :return: The smallest row position in each row's cluster.
+    """
+    labels = np.arange(row_count)
+    while True:
+        # Every linked row takes the lower label of the pair, then labels jump to their own label's label
+        low = np.minimum(labels[left], labels[right])
+        updated = labels.copy()
+        np.minimum.at(updated, left, low)
+        np.minimum.at(updated, right, low)
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+
+def find_duplicates(fields, threshold=DUPLICATE_THRESHOLD, window=BLOCK_WINDOW):
+    """
+    Finds rows that probably describe the same customer.
+
+    Candidate pairs come only from the blocking indexes (rows sharing a postcode, email domain or
+    Soundex surname, compared within a sliding window), so the work grows with rows * window
+    rather than with every pair of rows.
+
+    :param fields: Dict of field name to a Series of cleansed values, as for normalise_fields.
+    :param threshold: Score at which a pair is linked.
+    :param window: Rows each row is compared with inside a block.
+    :return: The cluster number of each row (0 for rows without duplicates, others numbered from 1
+        in order of their first row), each row's best score against its cluster, and the number
+        of candidate pairs compared.
+    """
+    normalised = normalise_fields(fields)
+    row_count = len(normalised)
+    field_codes = {name: codes(normalised[name]) for name in list(FIELD_WEIGHTS) + ["email_local"]}
+    sort_codes = codes(normalised["name"] + " " + normalised["surname"] + " " + normalised["email"])
+
+    pairs = [candidate_pairs(codes(normalised[key]), sort_codes, window) for key in BLOCKING_KEYS]
+    # A pair found through more than one index is only scored once
+    pair_ids = np.unique(np.concatenate([left * row_count + right for left, right in pairs]))
+    left, right = pair_ids // row_count, pair_ids % row_count
+
+    scores, compared = score_pairs(field_codes, left, right)
+    linked = (scores >= threshold) & (compared >= MIN_COMPARED_WEIGHT)
+    left, right, scores = left[linked], right[linked], scores[linked]
+
+    best_scores = np.zeros(row_count)
+    np.maximum.at(best_scores, left, scores)
+    np.maximum.at(best_scores, right, scores)
+
+    labels = connected_clusters(row_count, left, right)
+    sizes = np.bincount(labels, minlength=row_count)
+    in_cluster = sizes[labels] > 1
+    # Clusters are numbered in order of their first row; labels are already first rows
+    cluster_numbers = np.zeros(row_count, dtype=np.int64)
+    first_rows = np.flatnonzero(in_cluster & (labels == np.arange(row_count)))
+    cluster_numbers[first_rows] = np.arange(1, len(first_rows) + 1)
+    clusters = np.where(in_cluster, cluster_numbers[labels], 0)
+    return clusters, best_scores, len(pair_ids)
@@ -0,0 +1,150 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Formats DataCleanse reads and writes, and the file extensions that select each one.
+# Anything unrecognised is read as CSV, as every upload was before.
+DEFAULT_FORMAT = "csv"
+EXTENSIONS = {
+    ".csv": "csv",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".feather": "feather",
+    ".arrow": "feather",
+    ".ipc": "feather",
+    ".xlsx": "xlsx",
+}
+# Extension given to a file written in each format
+FORMAT_EXTENSIONS = {"csv": ".csv", "parquet": ".parquet", "feather": ".feather", "xlsx": ".xlsx"}
+MIMETYPES = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "feather": "application/vnd.apache.arrow.file",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+# Columnar inputs load into Arrow memory rather than one Python object per cell
+ARROW_BACKEND = "pyarrow"
+TEXT_DTYPE = "string[pyarrow]"
+
+
+def format_for_path(path, file_format=None):
+    """
+    Picks the format of a file, from an explicit choice or else its extension.
+
+    :param path: Path of the file.
+    :param file_format: A format name (or extension) overriding the file's extension, or None.
+    :return: One of the keys of FORMAT_EXTENSIONS.
+    """
+    if file_format:
+        file_format = file_format.lower().lstrip(".")
+        file_format = EXTENSIONS.get("." + file_format, file_format)
+        if file_format not in FORMAT_EXTENSIONS:
+            raise ValueError(f"Unsupported file format: {file_format}")
+        return file_format
+    return EXTENSIONS.get(os.path.splitext(path)[1].lower(), DEFAULT_FORMAT)
+
+
+def output_path(folder, input_path, file_format):
+    """
+    Names the processed file for an input: its own name when the format is unchanged,
+    otherwise the same stem with the output format's extension.
+    """
+    name = os.path.basename(input_path)
+    if format_for_path(input_path) != file_format:
+        name = os.path.splitext(name)[0] + FORMAT_EXTENSIONS[file_format]
+    return os.path.join(folder, name)
+
+
+def read_frame(path, file_format=None, csv_options=None):
+    """
+    Reads a file into a DataFrame.
+
+    :param file_format: Format name, or None to go by the extension.
+    :param csv_options: Extra pd.read_csv arguments, only used for CSV input.
+    :return: The DataFrame; columnar and Excel inputs come back with pyarrow-backed dtypes.
+    """
+    file_format = format_for_path(path, file_format)
+    if file_format == "csv":
+        return pd.read_csv(path, **(csv_options or {}))
+    if file_format == "parquet":
+        return pd.read_parquet(path, dtype_backend=ARROW_BACKEND)
+    if file_format == "feather":
+        return pd.read_feather(path, dtype_backend=ARROW_BACKEND)
+    # Excel needs the optional openpyxl package; pandas raises a clear ImportError without it
+    return pd.read_excel(path, dtype_backend=ARROW_BACKEND)
+
+
+def write_frame(file_data, path, file_format=None):
+    """
+    Writes a processed DataFrame. CSV keeps the fully quoted layout; the other formats
+    store every column as Arrow strings holding the same text the CSV would.
+    """
+    file_format = format_for_path(path, file_format)
+    if file_format == "csv":
+        file_data.to_csv(path, index=False, quoting=1)
+        return
+    file_data = to_text_columns(file_data)
+    if file_format == "parquet":
+        file_data.to_parquet(path, index=False)
+    elif file_format == "feather":
+        file_data.to_feather(path)
+    else:
+        # pandas picks the Excel writer by extension, so the path must end in .xlsx
+        file_data.to_excel(path, index=False, engine="openpyxl")
+
+
+def to_text_columns(file_data):
+    # Cleansed columns mix strings with numbers, which Arrow can't store in one column
+    text_data = file_data.astype(str).astype(TEXT_DTYPE)
+    return text_data.reset_index(drop=True)
+
+
+def to_working_dtypes(file_data):
+    """
+    Converts pyarrow-backed columns into the dtypes the cleanse stages work on, so a
+    Parquet, Feather or Excel input cleanses exactly as the same data read from CSV.
+
+    Text is trimmed while still in Arrow memory (one vectorized pass per column); missing
+    cells become NaN, which the stages treat as blank, rather than pd.NA, which they would
+    write out as "<NA>".
+    """
+    for position, dtype in enumerate(file_data.dtypes):
+        if not isinstance(dtype, pd.ArrowDtype):
+            continue
+        # Only reached for Arrow-backed data, so CSV-only installs don't need pyarrow
+        import pyarrow as pa
+        column = file_data.iloc[:, position]
+        if pd.api.types.is_string_dtype(dtype):
+            column = column.str.strip()
+        # pyarrow converts in C++ and shares one Python string between repeated values
+        values = pa.array(column.array).to_pandas()
+        values.index = file_data.index
+        file_data.isetitem(position, values.where(values.notna(), np.nan))
+    return file_data
+
+
+def convert(path, file_format):
+    """
+    Writes a processed file out in another format alongside it, reusing an earlier conversion
+    if it is still newer than the source.
+
+    :return: Path of the converted file.
+    """
+    source_format = format_for_path(path)
+    if source_format == file_format:
+        return path
+    target = os.path.splitext(path)[0] + FORMAT_EXTENSIONS[file_format]
+    if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path):
+        return target
+    if source_format == "csv":
+        # Processed CSV holds text only; read it back as such so nothing is re-typed
+        file_data = pd.read_csv(path, dtype=TEXT_DTYPE, keep_default_na=False)
+    else:
+        file_data = read_frame(path, source_format)
+    # The temporary name keeps the real extension last, which the Excel writer insists on
+    stem, extension = os.path.splitext(target)
+    partial_target = f"{stem}.part{extension}"
+    write_frame(file_data, partial_target, file_format)
+    os.replace(partial_target, target)
+    return target
@@ -0,0 +1,87 @@
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+def row_keys(ids):
+    """
+    Keys each row by its ID, numbering repeats of the same ID in file order so that
+    duplicate IDs still get a key of their own.
+
+    :param ids: The ID column as read from the file.
+    :return: A Series of string keys aligned with ids.
+    """
+    ids = ids.fillna("").astype(str)
+    return ids + "\x1f" + ids.groupby(ids, sort=False).cumcount().astype(str)
+
+
+def row_fingerprints(file_data):
+    # One 64-bit hash per row over every cell, so any edit to a row changes its fingerprint
+    return pd.util.hash_pandas_object(file_data, index=False).to_numpy()
+
+
+class RowStore:
+    def __init__(self, path, version):
+        """
+        Processed rows of the last run over a file, with the key and fingerprint of the
+        input row each one came from, so unchanged rows can be reused on the next run.
+
+        :param path: File the store is kept in, next to the processed file.
+        :param version: Ruleset version; a store written under any other version is ignored.
+        """
+        self.path = path
+        self.version = version
+        self.keys = None
+        self.fingerprints = None
+        self.rows = None
+
+    def load(self, header):
+        """
+        Loads the store if it was written for the same ruleset and input header.
+
+        :param header: Input column names; a store for a different layout is ignored.
+        :return: True if stored rows are available for reuse.
+        """
+        if not os.path.exists(self.path):
+            return False
+        try:
+            stored = pd.read_pickle(self.path)
+        except Exception as error:
+            logger.warning("Row store %s could not be read, cleansing every row: %s", self.path, error)
+            return False
+        if stored["version"] != self.version or stored["header"] != list(header):
+            return False
+        self.keys = pd.Index(stored["keys"])
+        self.fingerprints = stored["fingerprints"]
+        self.rows = stored["rows"]
+        return True
+
+    def lookup(self, keys, fingerprints):
+        """
+        Finds the stored row for each input row whose key and fingerprint are unchanged.
+
+        :return: Positions into the stored rows, -1 where the row is new or changed.
+        """
+        if self.rows is None:
+            return np.full(len(keys), -1)
+        positions = self.keys.get_indexer(keys)
+        found = positions >= 0
+        unchanged = np.zeros(len(keys), dtype=bool)
+        unchanged[found] = self.fingerprints[positions[found]] == fingerprints[found]
+        return np.where(unchanged, positions, -1)
+
+    def save(self, header, keys, fingerprints, rows):
+        # Written under a temporary name so a failed run never leaves a half-written store
+        partial_path = f"{self.path}.part"
+        pd.to_pickle({
+            "version": self.version,
+            "header": list(header),
+            "keys": list(keys),
+            "fingerprints": fingerprints,
+            "rows": rows.reset_index(drop=True),
+        }, partial_path)
+        os.replace(partial_path, self.path)
@@ -0,0 +1,162 @@
+import logging
+import multiprocessing
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+import tracing
+
+logger = logging.getLogger(__name__)
+
+
+def warm_worker():
+    # Runs as each pool worker starts: importing the app builds its compiled validators, postcode
+    # matcher index and country lookup once per worker, rather than during the worker's first job
+    import WebApp
+
+
+def run_cleanse(job_id, file_path, chunk_size, workers, csv_options, output_format, incremental, progress,
+                request_id=None, memory_optimized=False):
+    # Runs in a pool worker; imported here so the worker loads the app module itself
+    from WebApp import DataCleanse
+
+    # Log records from this job carry the ID of the request that submitted it
+    tracing.request_id.set(request_id or job_id)
+
+    def report(stage, stage_number, total_stages):
+        progress[job_id] = {"stage": stage, "stage_number": stage_number, "total_stages": total_stages}
+
+    start = time.perf_counter()
+    data_cleanse = DataCleanse(file_path, chunk_size=chunk_size, progress=report, workers=workers,
+                               csv_options=csv_options, output_format=output_format, incremental=incremental,
+                               memory_optimized=memory_optimized)
+    seconds = time.perf_counter() - start
+    stage_seconds = {}
+    for entry in data_cleanse.stage_report:
+        stage_seconds[entry["stage"]] = stage_seconds.get(entry["stage"], 0) + entry["seconds"]
+    logger.info("Cleansed %s", file_path, extra={
+        "job_id": job_id, "rows": data_cleanse.row_count, "seconds": round(seconds, 3),
+        "slowest_stage": max(stage_seconds, key=stage_seconds.get, default=None),
+        "stage_seconds": {stage: round(value, 3) for stage, value in stage_seconds.items()},
+        "country_lookups": data_cleanse.country_lookups,
+    })
+    return {"timings": data_cleanse.stage_report, "output": data_cleanse.output_path, "rows": data_cleanse.row_report,
+            "row_count": data_cleanse.row_count, "errors": data_cleanse.error_counts, "seconds": seconds,
+            "memory": data_cleanse.memory_report, "country_lookups": data_cleanse.country_lookups}
+
+
+class JobQueue:
+    def __init__(self, max_workers=2, max_pending=None, on_done=None, result_ttl=3600):
+        """
+        Runs DataCleanse jobs on a bounded process pool.
+
+        :param max_workers: Number of files cleansed at the same time.
+        :param max_pending: Maximum number of unfinished jobs accepted; None for no limit.
+        :param on_done: Optional callback(result) called with the result of every job that succeeds.
+        :param result_ttl: Seconds a finished job's status and result are kept after it ends.
+        """
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.on_done = on_done
+        self.result_ttl = result_ttl
+        self.jobs = {}
+        self.lock = threading.Lock()
+        # The pool and the shared progress dict are created on first use, so importing
+        # this module (including from inside a worker) does not start any processes
+        self.executor = None
+        self.progress = None
+
+    def start(self):
+        if self.executor is None:
+            self.progress = multiprocessing.Manager().dict()
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers, initializer=warm_worker)
+
+    def warm(self):
+        """
+        Starts every pool worker ahead of the first job, so the first uploads don't wait for them.
+        """
+        with self.lock:
+            self.start()
+        for future in [self.executor.submit(warm_worker) for _ in range(self.max_workers)]:
+            future.result()
+
+    def pending_count(self):
+        # Copied first, as metrics scrapes count from another thread while jobs are submitted
+        return sum(1 for job in list(self.jobs.values()) if not job["future"].done())
+
+    def submit(self, file_path, chunk_size=None, workers=1, csv_options=None, output_format=None, incremental=False,
+               request_id=None, memory_optimized=False):
+        """
+        Queues a file for cleansing.
+
+        :param request_id: ID of the submitting request, attached to the job's log records.
+        :return: The job ID, or None if the queue is full.
+        """
+        with self.lock:
+            self.start()
+            self.expire()
+            if self.max_pending is not None and self.pending_count() >= self.max_pending:
+                logger.warning("Job queue full, refusing %s", file_path, extra={"pending": self.pending_count()})
+                return None
+            job_id = uuid.uuid4().hex
+            future = self.executor.submit(run_cleanse, job_id, file_path, chunk_size, workers, csv_options,
+                                          output_format, incremental, self.progress, request_id, memory_optimized)
+            self.jobs[job_id] = {"future": future, "file_path": file_path, "submitted": time.time(),
+                                 "request_id": request_id}
+            future.add_done_callback(lambda done: self.job_done(job_id, done))
+            logger.info("Queued %s", file_path, extra={"job_id": job_id, "pending": self.pending_count()})
+            return job_id
+
+    def expire(self):
+        # Forgets jobs that finished more than result_ttl seconds ago, and their progress, so a
+        # long-running server doesn't keep every result; called with the lock held
+        cutoff = time.time() - self.result_ttl
+        expired = [job_id for job_id, job in list(self.jobs.items()) if job.get("finished", cutoff) < cutoff]
+        for job_id in expired:
+            del self.jobs[job_id]
+            self.progress.pop(job_id, None)
+        if expired:
+            logger.debug("Expired %d finished jobs", len(expired))
+
+    def job_done(self, job_id, future):
+        # Called on the pool's management thread, outside the submitting request
+        self.jobs[job_id]["finished"] = time.time()
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            logger.error("Job failed: %s", future.exception(),
+                         extra={"job_id": job_id, "request_id": self.jobs[job_id]["request_id"]})
+        elif self.on_done:
+            self.on_done(future.result())
+
+    def wait(self, job_id):
+        # Blocks until the job finishes, re-raising any error from the worker; returns a dict of the
+        # stage timings, the processed file's path, the reused/recomputed row counts (incremental only)
+        # the memory saved by compact columns (memory-optimized mode only) and the country cache hits and misses
+        return self.jobs[job_id]["future"].result()
+
+    def status(self, job_id):
+        """
+        Describes a job's state and progress through the pipeline stages.
+
+        :return: A dict for the job, or None if the job ID is unknown.
+        """
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        future = job["future"]
+        status = {"job_id": job_id, "file": job["file_path"], "submitted": job["submitted"],
+                  "request_id": job["request_id"]}
+        if future.running():
+            status["status"] = "running"
+        elif not future.done():
+            status["status"] = "queued"
+        elif future.exception() is not None:
+            status["status"] = "failed"
+            status["error"] = str(future.exception())
+        else:
+            status["status"] = "done"
+            status.update(future.result())
+        status.update(self.progress.get(job_id, {}))
+        return status
@@ -0,0 +1,146 @@
+import bisect
+import math
+import threading
+
+# Upper bounds (seconds) of the duration histograms; cleansing a large upload can take minutes
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in pairs) + "}"
+
+
+def format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        """
+        A named metric with one value per combination of label values.
+
+        :param name: Metric name, e.g. "datacleanse_rows_total".
+        :param documentation: One-line description shown as the metric's HELP.
+        :param labels: Names of the labels every sample is recorded with.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} takes labels {list(self.labels)}, got {sorted(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def samples(self):
+        # (suffix, label values, extra labels, value) for every series
+        with self.lock:
+            return [("", key, (), value) for key, value in sorted(self.values.items())]
+
+    def exposition(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, key, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{format_labels(self.labels, key, extra)} {format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labels=(), callback=None):
+        # A callback gauge reads its (unlabelled) value when scraped, e.g. the current queue depth
+        super().__init__(name, documentation, labels)
+        self.callback = callback
+
+    def set(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def samples(self):
+        if self.callback is not None:
+            return [("", (), (), self.callback())]
+        return super().samples()
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DURATION_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            counts, total = self.values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.values[key] = (counts, total + value)
+
+    def samples(self):
+        samples = []
+        with self.lock:
+            series = sorted((key, list(counts), total) for key, (counts, total) in self.values.items())
+        for key, counts, total in series:
+            # Buckets are cumulative: each counts every observation up to its bound
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                samples.append(("_bucket", key, [("le", format_value(bound))], cumulative))
+            samples.append(("_sum", key, (), total))
+            samples.append(("_count", key, (), cumulative))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        # Metrics in the order they were registered, which is the order they are exposed in
+        self.metrics = {}
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name, documentation, labels=(), callback=None):
+        return self.register(Gauge(name, documentation, labels, callback))
+
+    def histogram(self, name, documentation, labels=(), buckets=DURATION_BUCKETS):
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def exposition(self):
+        """
+        Renders every metric in the Prometheus text format (version 0.0.4).
+        """
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.exposition())
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,40 @@
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import tracing
+from pipeline import merge_reports
+
+
+def cleanse_partition(file_data, request_id=None):
+    # Runs in a pool worker; imported here so the worker loads the app module itself
+    from WebApp import DataCleanse
+
+    tracing.request_id.set(request_id)
+    cleanse = DataCleanse()
+    return cleanse.cleanse(file_data), cleanse.stage_report, cleanse.country_lookups
+
+
+def cleanse_parallel(file_data, workers):
+    """
+    Cleanses row partitions of a DataFrame across a process pool.
+
+    Every cleanse stage works row by row, so the partitions are cleansed
+    independently and put back together in their original order.
+
+    :param file_data: The normalised DataFrame to cleanse.
+    :param workers: Number of worker processes (and partitions).
+    :return: The cleansed DataFrame, and the partitions' stage timings and country lookups added together.
+    """
+    partition_count = max(1, min(workers, len(file_data)))
+    bounds = [len(file_data) * i // partition_count for i in range(partition_count + 1)]
+    partitions = [file_data.iloc[start:stop] for start, stop in zip(bounds, bounds[1:])]
+    # Workers log under the ID of the request the file came from
+    request_ids = itertools.repeat(tracing.request_id.get())
+    with ProcessPoolExecutor(max_workers=partition_count) as executor:
+        cleansed, reports, lookups = zip(*executor.map(cleanse_partition, partitions, request_ids))
+    # Partitions can disagree on which optional columns they created; keep them all in first-seen order
+    columns = list(dict.fromkeys(column for partition in cleansed for column in partition.columns))
+    country_lookups = {key: sum(partition[key] for partition in lookups) for key in ["hits", "misses"]}
+    return pd.concat(cleansed).reindex(columns=columns).fillna(""), merge_reports(reports), country_lookups
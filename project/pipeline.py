@@ -0,0 +1,106 @@
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Stand-in for "every column", for stages that scan or move values across the whole row
+ALL_COLUMNS = "*"
+
+
+def columns_memory(file_data, columns):
+    # Deep size of just these columns; sizing the whole frame around every stage costs more than the stages
+    return int(sum(file_data.iloc[:, position].memory_usage(deep=True, index=False)
+                   for position, column in enumerate(file_data.columns) if column in columns))
+
+
+class Stage:
+    def __init__(self, name, inputs, outputs):
+        """
+        A cleanse step and the columns it reads and writes.
+
+        :param name: Name of the DataCleanse method that runs the step.
+        :param inputs: Columns (or field names) the step reads, or [ALL_COLUMNS].
+        :param outputs: Columns (or field names) the step writes.
+        """
+        self.name = name
+        self.inputs = inputs
+        self.outputs = outputs
+
+
+class Pipeline:
+    def __init__(self, stages):
+        self.stages = stages
+
+    def run(self, cleanse, file_data, progress=None):
+        """
+        Runs every stage on file_data in place and times each one.
+
+        A stage listed more than once is only re-run over the columns it reads that its previous
+        run or a later stage wrote, and skipped when there are none. Its own previous writes are
+        included because a relocation can swap one valid value for another, which a second full
+        pass would swap back.
+
+        :param cleanse: The DataCleanse whose methods implement the stages and resolve their columns.
+        :param file_data: The DataFrame (whole file, chunk or partition) to cleanse.
+        :param progress: Optional callback(stage, stage_number, total_stages).
+        :return: A list with one timing dict per stage.
+        """
+        written = {}  # column -> position of the stage that last wrote it
+        last_run = {}  # stage name -> position of its previous run
+        report = []
+        for position, stage in enumerate(self.stages):
+            if progress:
+                progress(stage.name, position + 1, len(self.stages))
+            columns = None
+            if stage.name in last_run:
+                reads = None if ALL_COLUMNS in stage.inputs else cleanse.resolve_columns(file_data, stage.inputs)
+                columns = [column for column, wrote_at in written.items()
+                           if wrote_at >= last_run[stage.name] and column in file_data.columns
+                           and (reads is None or column in reads)]
+            last_run[stage.name] = position
+
+            memory_before = columns_memory(file_data, cleanse.resolve_columns(file_data, stage.outputs))
+            start = time.perf_counter()
+            if columns is None:
+                getattr(cleanse, stage.name)(file_data)
+            elif columns:
+                getattr(cleanse, stage.name)(file_data, columns=columns)
+            seconds = time.perf_counter() - start
+
+            logger.debug("Stage %s took %.3fs", stage.name, seconds,
+                         extra={"stage": stage.name, "seconds": seconds, "rows": len(file_data)})
+            if columns is None or columns:
+                for column in cleanse.stage_outputs(stage, file_data):
+                    written[column] = position
+            report.append({
+                "stage": stage.name,
+                "seconds": seconds,
+                "rows": len(file_data),
+                # Growth of the stage's output columns (new ones, e.g. error columns, count from zero)
+                "memory_delta": columns_memory(file_data, cleanse.resolve_columns(file_data, stage.outputs)) - memory_before,
+                "columns": columns,
+                "skipped": columns == [],
+            })
+        return report
+
+
+def merge_reports(reports):
+    """
+    Adds up the timing reports of several runs of the same pipeline (chunks or partitions).
+    """
+    reports = [report for report in reports if report]
+    if not reports:
+        return []
+    merged = []
+    for entries in zip(*reports):
+        merged.append({
+            "stage": entries[0]["stage"],
+            "seconds": sum(entry["seconds"] for entry in entries),
+            "rows": sum(entry["rows"] for entry in entries),
+            "memory_delta": sum(entry["memory_delta"] for entry in entries),
+            "columns": None if entries[0]["columns"] is None else list(
+                dict.fromkeys(column for entry in entries for column in entry["columns"])
+            ),
+            "skipped": all(entry["skipped"] for entry in entries),
+        })
+    return merged
@@ -1,27 +1,175 @@
-import re
+import itertools
+import string
+
 import pandas as pd
 
+from validators import validators
+
+# Shapes each country's postcodes take: every letter written as "A", every digit as "9", spaces and
+# dashes kept. A country's full pattern (validators "postcode_format") is only tried on postcodes
+# whose shape it lists, so add both when supporting a new country.
+POSTCODE_SHAPES = {
+    "GBR": ["A9 9AA", "A99 9AA", "AA9 9AA", "AA99 9AA", "A9A 9AA", "AA9A 9AA",
+            "A99AA", "A999AA", "AA99AA", "AA999AA", "A9A9AA", "AA9A9AA", "AAA 9AA", "AAA9AA"],
+    # Eircodes: a routing key (A99, or D6W) and four letters or digits in any order
+    "IRL": [routing_key + space + "".join(identifier) for routing_key in ["A99", "A9A"] for space in [" ", ""]
+            for identifier in itertools.product("A9", repeat=4)],
+    "USA": ["99999", "99999-9999"],
+    "CAN": ["A9A 9A9", "A9A9A9"],
+    "NLD": ["9999 AA", "9999AA"],
+    "ARG": ["A9999AAA"],
+    "LUX": ["9999", "A-9999"],
+    "LVA": ["AA-9999"],
+    "LTU": ["AA-99999", "99999"],
+    "POL": ["99-999"],
+    "PRT": ["9999-999"],
+    "BRA": ["99999-999", "99999999"],
+    "JPN": ["999-9999", "9999999"],
+    "SWE": ["999 99", "99999"],
+    "CZE": ["999 99", "99999"],
+    "SVK": ["999 99", "99999"],
+    "GRC": ["999 99", "99999"],
+    "DEU": ["99999"],
+    "FRA": ["99999"],
+    "ITA": ["99999"],
+    "ESP": ["99999"],
+    "FIN": ["99999"],
+    "EST": ["99999"],
+    "HRV": ["99999"],
+    "TUR": ["99999"],
+    "UKR": ["99999"],
+    "MEX": ["99999"],
+    "KOR": ["99999"],
+    "MYS": ["99999"],
+    "SAU": ["99999"],
+    "AUS": ["9999"],
+    "NZL": ["9999"],
+    "ZAF": ["9999"],
+    "BEL": ["9999"],
+    "CHE": ["9999"],
+    "AUT": ["9999"],
+    "DNK": ["9999"],
+    "NOR": ["9999"],
+    "HUN": ["9999"],
+    "SVN": ["9999"],
+    "ISL": ["999"],
+    "ISR": ["9999999"],
+    "IND": ["999999"],
+    "CHN": ["999999"],
+    "RUS": ["999999"],
+    "SGP": ["999999"],
+    "ROU": ["999999"],
+}
+
+# Maps a postcode's characters to its shape in one str.translate call
+SHAPE_TABLE = str.maketrans(string.ascii_uppercase + string.digits, "A" * 26 + "9" * 10)
+
+
+def normalise_postcode(postcode):
+    # Upper case, trimmed, with runs of whitespace reduced to one space; "" for missing values
+    if not isinstance(postcode, str):
+        return "" if pd.isna(postcode) else str(postcode)
+    return " ".join(postcode.upper().split())
+
+
+def postcode_shape(postcode):
+    return postcode.translate(SHAPE_TABLE)
+
+
 class PostcodeMatcher:
     def __init__(self):
-        # Define dictionary mapping country ISO codes to their postcode regex patterns
-        self.postcode_patterns = {
-            "GBR": r"^(GIR\s0AA|[A-PR-UWYZ]([0-9]{1,2}|([A-HK-Y][0-9]|[A-HK-Y][0-9]([0-9]|[ABEHMNPRV-Y]))|[0-9][A-HJKS-UW])[0-9][ABD-HJLNP-UW-Z]{2})$",
-            "IRL": r"^[A-Za-z]\d{2}\s[A-Za-z]\d[A-Za-z]\d$", 
-            # Add more countries and their postcode patterns as needed
-        }
+        # Compiled postcode patterns per country ISO code, from the shared validator registry.
+        # Add more countries and their postcode patterns in validators.VALIDATOR_PATTERNS.
+        self.postcode_patterns = validators.countries("postcode_format")
+        # Countries to try for each postcode length and shape, in registry order
+        self.shape_index = {}
+        for iso_code in self.postcode_patterns:
+            for shape in POSTCODE_SHAPES.get(iso_code, []):
+                self.shape_index.setdefault(len(shape), {}).setdefault(shape, []).append(iso_code)
 
     def validate_postcode_for_country(self, postcode, iso_code):
         """
         Validates a postcode for a specific country ISO code.
 
-        :param postcode: The postcode to validate.
+        :param postcode: The postcode to validate, in any case and spacing.
         :param iso_code: The ISO code of the country.
         :return: True if the postcode is valid for the country, False otherwise.
         """
         if isinstance(iso_code, str) and iso_code in self.postcode_patterns:
-            pattern = self.postcode_patterns[iso_code]
-            return bool(re.match(pattern, postcode))
+            # The patterns are written for normalised (upper-case) postcodes, as in match_postcode_to_isos
+            return bool(self.postcode_patterns[iso_code].match(normalise_postcode(postcode)))
         else:
             # Handle the case where the ISO code is not found or is not a string
             return False
 
+    def validate_postcodes_for_country(self, postcodes, iso_code):
+        """
+        Validates a whole column of postcodes for a specific country ISO code.
+
+        :param postcodes: A pandas Series of postcodes, in any case and spacing.
+        :param iso_code: The ISO code of the country.
+        :return: A boolean Series, True where the postcode is valid for the country.
+        """
+        if isinstance(iso_code, str) and iso_code in self.postcode_patterns:
+            return validators.match_series("postcode_format", postcodes.map(normalise_postcode), iso_code)
+        return pd.Series(False, index=postcodes.index)
+
+    def candidate_countries(self, postcode):
+        # Countries whose postcodes can take this (normalised) postcode's length and shape
+        shapes = self.shape_index.get(len(postcode))
+        if not shapes:
+            return []
+        return shapes.get(postcode_shape(postcode), [])
+
+    def match_postcode_to_isos(self, postcode):
+        """
+        Infers which countries a postcode could belong to.
+
+        Only the countries listed for the postcode's length and shape are confirmed with their
+        full patterns, so a lookup costs one dict lookup and a few regex matches.
+
+        :param postcode: The postcode, in any case and spacing.
+        :return: A list of matching country ISO-3 codes, empty if none match.
+        """
+        postcode = normalise_postcode(postcode)
+        return [iso_code for iso_code in self.candidate_countries(postcode)
+                if self.postcode_patterns[iso_code].match(postcode)]
+
+    def match_postcode_to_iso(self, postcode, preferred=None):
+        """
+        Infers the country of a postcode.
+
+        :param postcode: The postcode, in any case and spacing.
+        :param preferred: ISO-3 code to return if it is among the matches, e.g. the row's country.
+        :return: The preferred ISO code if it matches, else the first matching one, or None.
+        """
+        iso_codes = self.match_postcode_to_isos(postcode)
+        if preferred in iso_codes:
+            return preferred
+        return iso_codes[0] if iso_codes else None
+
+    def match_series(self, postcodes):
+        """
+        Infers the countries of a whole column of postcodes, working out each distinct value once.
+
+        :param postcodes: A pandas Series of postcodes.
+        :return: A Series of tuples of matching ISO-3 codes (empty where none match).
+        """
+        normalised = postcodes.map(normalise_postcode)
+        matches = {postcode: tuple(self.match_postcode_to_isos(postcode)) for postcode in normalised.unique()}
+        return normalised.map(matches)
+
+    def cross_check_countries(self, postcodes, iso_codes):
+        """
+        Finds rows whose postcode belongs to other countries than the one the row gives.
+
+        :param postcodes: A pandas Series of postcodes.
+        :param iso_codes: A Series of the rows' country ISO-3 codes, aligned with postcodes.
+        :return: A boolean Series, True where the postcode matches at least one country but not
+            the row's. Rows with a blank or unrecognised postcode or country are not flagged.
+        """
+        matches = self.match_series(postcodes)
+        known_country = iso_codes.isin(list(self.postcode_patterns))
+        consistent = pd.Series([iso_code in countries for iso_code, countries in zip(iso_codes, matches)],
+                               index=postcodes.index, dtype=bool)
+        return (matches.str.len() > 0) & known_country & ~consistent
@@ -0,0 +1,105 @@
+import csv
+import io
+import os
+import threading
+from array import array
+
+
+def read_record(file):
+    # Reads one CSV record as bytes; quoted fields may span lines, so keep going until quotes balance
+    record = file.readline()
+    while record and record.count(b'"') % 2:
+        line = file.readline()
+        if not line:
+            break
+        record += line
+    return record
+
+
+def parse_records(records):
+    return list(csv.reader(io.StringIO(b"".join(records).decode("utf-8"))))
+
+
+class RowIndex:
+    def __init__(self, path):
+        """
+        Byte offsets of the rows of a CSV file, extended as far as pages have been read.
+
+        The first page never waits for the whole file to be scanned, and any page
+        already covered by the index is read with a single seek.
+
+        :param path: Path of the CSV file.
+        """
+        self.path = path
+        stat = os.stat(path)
+        self.signature = (stat.st_mtime_ns, stat.st_size)
+        self.lock = threading.Lock()
+        self.offsets = array("q")
+        self.complete = False
+        with open(path, "rb") as file:
+            header = parse_records([read_record(file)])
+            self.columns = header[0] if header else []
+            self.scanned_to = file.tell()
+
+    def ensure(self, row_count):
+        # Extends the index until it covers row_count rows or reaches the end of the file
+        if self.complete or len(self.offsets) >= row_count:
+            return
+        with open(self.path, "rb") as file:
+            file.seek(self.scanned_to)
+            while len(self.offsets) < row_count:
+                position = file.tell()
+                record = read_record(file)
+                if not record:
+                    self.complete = True
+                    break
+                if record.strip():
+                    self.offsets.append(position)
+            self.scanned_to = file.tell()
+
+    def page(self, offset, limit):
+        """
+        Reads a window of rows.
+
+        :param offset: Index of the first row (0 is the first row after the header).
+        :param limit: Maximum number of rows to return.
+        :return: A dict of columns, rows, offset, limit, has_more and total_rows
+                 (None until the whole file has been indexed).
+        """
+        with self.lock:
+            # One row past the window tells whether there is another page
+            self.ensure(offset + limit + 1)
+            rows = []
+            if offset < len(self.offsets):
+                count = min(limit, len(self.offsets) - offset)
+                records = []
+                with open(self.path, "rb") as file:
+                    file.seek(self.offsets[offset])
+                    while len(records) < count:
+                        record = read_record(file)
+                        if record.strip():
+                            records.append(record)
+                rows = parse_records(records)
+            return {
+                "columns": self.columns,
+                "rows": rows,
+                "offset": offset,
+                "limit": limit,
+                "has_more": len(self.offsets) > offset + limit,
+                "total_rows": len(self.offsets) if self.complete else None,
+            }
+
+
+class PreviewIndexes:
+    def __init__(self):
+        # One RowIndex per processed file, rebuilt when the file is rewritten
+        self.indexes = {}
+        self.lock = threading.Lock()
+
+    def get(self, path):
+        stat = os.stat(path)
+        with self.lock:
+            index = self.indexes.get(path)
+            if index is None or index.signature != (stat.st_mtime_ns, stat.st_size):
+                index = self.indexes[path] = RowIndex(path)
+            return index
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+
+def match_mask(file_data, match_series, col_indices=None):
+    """
+    Evaluates a validator over every column at once.
+
+    :param file_data: The DataFrame to scan.
+    :param match_series: Function taking a column and returning a boolean Series of valid values.
+    :param col_indices: Positions of the columns to evaluate; None for all of them.
+    :return: A boolean numpy array of shape (rows, columns), False for columns not evaluated.
+    """
+    mask = np.zeros(file_data.shape, dtype=bool)
+    for col_idx in range(file_data.shape[1]) if col_indices is None else col_indices:
+        mask[:, col_idx] = match_series(file_data.iloc[:, col_idx]).to_numpy(dtype=bool)
+    return mask
+
+
+def writable(column):
+    # Categoricals only take values among their categories, which relocated values rarely are
+    return column.astype(object) if isinstance(column.dtype, pd.CategoricalDtype) else column
+
+
+def relocate_matches(file_data, match_series, expected_col_idx, col_indices=None):
+    """
+    Moves values the validator accepts into the expected column, in place.
+
+    Gives the same result as swapping each matching cell with the expected column
+    row by row, left to right: the expected column ends up with the last match of
+    the row, and each matching cell receives the value the swap before it left behind.
+
+    :param file_data: The DataFrame to update.
+    :param match_series: Column validator for the field, as taken by match_mask.
+    :param expected_col_idx: Position of the column the values belong in.
+    :param col_indices: Positions of the columns to take values from; None for all of them.
+    :return: The boolean match mask, with the expected column cleared.
+    """
+    mask = match_mask(file_data, match_series, col_indices)
+    mask[:, expected_col_idx] = False
+    if not mask.any():
+        return mask
+
+    # carry holds, per row, the value the next matching column will receive
+    carry = writable(file_data.iloc[:, expected_col_idx])
+    for col_idx in range(file_data.shape[1]):
+        col_mask = mask[:, col_idx]
+        if not col_mask.any():
+            continue
+        original = writable(file_data.iloc[:, col_idx])
+        file_data.isetitem(col_idx, original.where(~col_mask, carry))
+        carry = carry.where(~col_mask, original)
+    file_data.isetitem(expected_col_idx, carry)
+    return mask
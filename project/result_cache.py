@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+
+def ruleset_version(*parts):
+    # Fingerprint of everything that decides the cleanse output (patterns, stages, code version)
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+class ResultCache:
+    def __init__(self, folder, max_bytes, version):
+        """
+        Processed files stored on disk by upload hash, evicted least recently used first.
+
+        :param folder: Directory holding the cached results.
+        :param max_bytes: Total size the cached results may take; 0 disables the cache.
+        :param version: Ruleset version; results from any other version are discarded.
+        """
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.version = version
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(folder, exist_ok=True)
+        # Results written under an older ruleset can never be hit again
+        for name in os.listdir(folder):
+            if not name.startswith(f"{version}-"):
+                os.remove(os.path.join(folder, name))
+
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def key(self, content_hash, mode):
+        return f"{self.version}-{mode}-{content_hash}"
+
+    def path(self, key):
+        return os.path.join(self.folder, key)
+
+    def get(self, key):
+        """
+        :return: Path of the cached result, or None on a miss.
+        """
+        with self.lock:
+            path = self.path(key)
+            if not os.path.exists(path):
+                self.misses += 1
+                return None
+            self.hits += 1
+            # Touch the entry so eviction treats it as recently used
+            os.utime(path)
+            return path
+
+    def put(self, key, processed_path):
+        with self.lock:
+            shutil.copyfile(processed_path, self.path(key))
+            self.evict()
+
+    def entries(self):
+        # (mtime, size, path) of every cached result, oldest first
+        entries = []
+        for name in os.listdir(self.folder):
+            path = os.path.join(self.folder, name)
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return sorted(entries)
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+            self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            entries = self.entries()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else None,
+                "evictions": self.evictions,
+                "entries": len(entries),
+                "bytes": sum(size for _, size, _ in entries),
+                "max_bytes": self.max_bytes,
+                "version": self.version,
+            }
@@ -0,0 +1,68 @@
+import re
+
+# Header signatures whose mapping is kept; exports rarely come in more than a handful of layouts
+SCHEMA_CACHE_SIZE = 256
+
+
+def normalise_header(header):
+    # Lower case with everything but letters and digits dropped, so "Post_Code", "post code"
+    # and "POSTCODE" (or a header carrying a byte order mark) all read as "postcode"
+    return re.sub(r"[^0-9a-z]", "", str(header).lower())
+
+
+class Schema:
+    def __init__(self, columns):
+        """
+        The column each field was found in, for one header layout.
+
+        :param columns: Dict of field name to column name, for the fields the header has.
+        """
+        self.columns = columns
+
+    def column(self, field):
+        # The field's column name, or None if the file has no such column
+        return self.columns.get(field)
+
+    def __contains__(self, field):
+        return field in self.columns
+
+
+class SchemaResolver:
+    def __init__(self, aliases):
+        """
+        Maps file headers to canonical fields, caching the result per header layout.
+
+        :param aliases: Dict of field name to the headers that identify it. Headers are compared
+            after normalise_header, and an alias may identify more than one field.
+        """
+        self.fields = {}  # normalised alias -> fields it identifies
+        for field, names in aliases.items():
+            for name in names:
+                self.fields.setdefault(normalise_header(name), []).append(field)
+        self.cache = {}
+        self.hits = 0
+        self.misses = 0
+
+    def resolve(self, columns):
+        """
+        Finds every field's column in one pass over the header.
+
+        :param columns: The header, e.g. a DataFrame's columns.
+        :return: A Schema; when several columns match a field, the first one in the header wins.
+        """
+        signature = tuple(columns)
+        schema = self.cache.get(signature)
+        if schema is not None:
+            self.hits += 1
+            return schema
+        self.misses += 1
+        mapping = {}
+        for column in signature:
+            for field in self.fields.get(normalise_header(column), []):
+                mapping.setdefault(field, column)
+        schema = Schema(mapping)
+        if len(self.cache) >= SCHEMA_CACHE_SIZE:
+            # Drop the oldest layout; dicts keep insertion order
+            del self.cache[next(iter(self.cache))]
+        self.cache[signature] = schema
+        return schema
@@ -0,0 +1,69 @@
+import codecs
+import csv
+import hashlib
+import zlib
+
+STREAM_BLOCK_SIZE = 64 * 1024
+# Bytes from the start of an upload used to detect its encoding and delimiter
+SNIFF_SAMPLE_SIZE = 64 * 1024
+SNIFF_DELIMITERS = ",;\t|"
+
+
+def sniff_encoding(sample):
+    if sample.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return "utf-16"
+    try:
+        # Not final, so a multi-byte character cut off at the end of the sample is not an error
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        # Latin-1 decodes any byte, so the read never fails on legacy exports
+        return "latin-1"
+
+
+def sniff_delimiter(text):
+    # Only look at complete lines
+    text = text[:text.rfind("\n") + 1] or text
+    try:
+        return csv.Sniffer().sniff(text, delimiters=SNIFF_DELIMITERS).delimiter
+    except csv.Error:
+        return ","
+
+
+def save_upload(stream, path):
+    """
+    Copies an uploaded file to disk in fixed-size blocks, hashing it and sniffing its format on the way.
+
+    :param stream: Binary stream of the upload.
+    :param path: Where to write the file.
+    :return: A tuple of (SHA-256 hex digest, read_csv options with the detected encoding and sep).
+    """
+    digest = hashlib.sha256()
+    sample = b""
+    with open(path, "wb") as upload:
+        for block in iter(lambda: stream.read(STREAM_BLOCK_SIZE), b""):
+            digest.update(block)
+            if len(sample) < SNIFF_SAMPLE_SIZE:
+                sample += block[:SNIFF_SAMPLE_SIZE - len(sample)]
+            upload.write(block)
+    encoding = sniff_encoding(sample)
+    csv_options = {"encoding": encoding, "sep": sniff_delimiter(sample.decode(encoding, errors="ignore"))}
+    return digest.hexdigest(), csv_options
+
+
+def stream_file(path, compress=False):
+    """
+    Yields a file in fixed-size blocks, optionally gzip-compressed on the fly.
+    """
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS) if compress else None
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(STREAM_BLOCK_SIZE), b""):
+            if compressor:
+                block = compressor.compress(block)
+                if not block:
+                    continue
+            yield block
+    if compressor:
+        yield compressor.flush()
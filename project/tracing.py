@@ -0,0 +1,60 @@
+import contextvars
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+
+# ID of the request (or job) being handled, attached to every log record made while handling it
+request_id = contextvars.ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else on a record came from a log call's extra={...}
+STANDARD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+
+def new_request_id():
+    return uuid.uuid4().hex[:16]
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        # A record logged outside the request's context may name the request itself, via extra
+        record.request_id = getattr(record, "request_id", None) or request_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Writes each record as one JSON object: time, level, logger, message, request_id and any extra fields.
+    """
+
+    def format(self, record):
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in STANDARD_ATTRIBUTES})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level=None):
+    """
+    Sends all logging to stderr as JSON lines tagged with the request ID. Safe to call more than
+    once (each worker process that imports the app calls it again).
+
+    :param level: Level name; defaults to the LOG_LEVEL environment variable, else INFO.
+    """
+    root = logging.getLogger()
+    if any(isinstance(handler.formatter, JsonFormatter) for handler in root.handlers):
+        return
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JsonFormatter())
+    handler.addFilter(RequestIdFilter())
+    root.addHandler(handler)
+    root.setLevel(level or os.environ.get("LOG_LEVEL", "INFO").upper())
@@ -0,0 +1,143 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from compact import as_text
+
+# Key for patterns that apply whatever the country
+ANY_COUNTRY = "*"
+
+# Regex patterns per field type and country ISO-3 code.
+# Support a new country by adding its pattern here (or via validators.register).
+VALIDATOR_PATTERNS = {
+    # Loose postcode shape used to spot postcodes in any column
+    "postcode": {
+        "GBR": r"^([Gg][Ii][Rr] 0[Aa]{2})|((([A-Za-z][0-9]{1,2})|(([A-Za-z][A-Ha-hJ-Yj-y][0-9]{1,2})|(([A-Za-z][0-9][A-Za-z])|([A-Za-z][A-Ha-hJ-Yj-y][0-9][A-Za-z]?))))\s?[0-9][A-Za-z]{2})",
+    },
+    # Full postcode format per country, used by PostcodeMatcher (which also needs the country's
+    # shapes in postcode_matcher.POSTCODE_SHAPES). Written for upper case with single spaces.
+    "postcode_format": {
+        "GBR": r"^(GIR\s?0AA|[A-PR-UWYZ]([0-9]{1,2}|([A-HK-Y][0-9]|[A-HK-Y][0-9]([0-9]|[ABEHMNPRV-Y]))|[0-9][A-HJKS-UW])\s?[0-9][ABD-HJLNP-UW-Z]{2})$",
+        "IRL": r"^([AC-FHKNPRTV-Y]\d{2}|D6W)\s?[0-9AC-FHKNPRTV-Y]{4}$",
+        "USA": r"^\d{5}(-\d{4})?$",
+        "CAN": r"^[ABCEGHJ-NPRSTVXY]\d[ABCEGHJ-NPRSTV-Z]\s?\d[ABCEGHJ-NPRSTV-Z]\d$",
+        "NLD": r"^[1-9]\d{3}\s?[A-Z]{2}$",
+        "ARG": r"^[A-HJ-NP-Z]\d{4}[A-Z]{3}$",
+        "LUX": r"^(L-)?\d{4}$",
+        "LVA": r"^LV-\d{4}$",
+        "LTU": r"^(LT-)?\d{5}$",
+        "POL": r"^\d{2}-\d{3}$",
+        "PRT": r"^[1-9]\d{3}-\d{3}$",
+        "BRA": r"^\d{5}-?\d{3}$",
+        "JPN": r"^\d{3}-?\d{4}$",
+        "SWE": r"^[1-9]\d{2}\s?\d{2}$",
+        "CZE": r"^[1-7]\d{2}\s?\d{2}$",
+        "SVK": r"^[089]\d{2}\s?\d{2}$",
+        "GRC": r"^[1-8]\d{2}\s?\d{2}$",
+        "DEU": r"^(0[1-9]|[1-9]\d)\d{3}$",
+        "FRA": r"^(0[1-9]|[1-8]\d|9[0-8])\d{3}$",
+        "ITA": r"^\d{5}$",
+        "ESP": r"^(0[1-9]|[1-4]\d|5[0-2])\d{3}$",
+        "FIN": r"^\d{5}$",
+        "EST": r"^\d{5}$",
+        "HRV": r"^[1-5]\d{4}$",
+        "TUR": r"^(0[1-9]|[1-7]\d|8[01])\d{3}$",
+        "UKR": r"^\d{5}$",
+        "MEX": r"^\d{5}$",
+        "KOR": r"^\d{5}$",
+        "MYS": r"^\d{5}$",
+        "SAU": r"^[1-9]\d{4}$",
+        "AUS": r"^(0[289]|[1-9]\d)\d{2}$",
+        "NZL": r"^\d{4}$",
+        "ZAF": r"^\d{4}$",
+        "BEL": r"^[1-9]\d{3}$",
+        "CHE": r"^[1-9]\d{3}$",
+        "AUT": r"^[1-9]\d{3}$",
+        "DNK": r"^[1-9]\d{3}$",
+        "NOR": r"^\d{4}$",
+        "HUN": r"^[1-9]\d{3}$",
+        "SVN": r"^[1-9]\d{3}$",
+        "ISL": r"^[1-9]\d{2}$",
+        "ISR": r"^\d{7}$",
+        "IND": r"^[1-9]\d{5}$",
+        "CHN": r"^\d{6}$",
+        "RUS": r"^[1-6]\d{5}$",
+        "SGP": r"^\d{6}$",
+        "ROU": r"^\d{6}$",
+    },
+    "phone": {
+        "GBR": r"^\d{3}\s\d{8,}$",
+        "USA": r"^\(?\d{3}\)?[\s.-]?\d{3}[\s.-]?\d{4}$",
+        "IRL": r"^\(?\d{3}\)?[\s.-]?\d{3}[\s.-]?\d{4}$",  # Example pattern for Ireland, adjust as needed
+    },
+    "landline": {
+        "GBR": r"^(\d{2}\s\d{5}\s\d{5})$",
+    },
+    "email": {
+        ANY_COUNTRY: r"\S+@\S+\.\S+",
+    },
+    "additional": {
+        ANY_COUNTRY: r"[\w\.-]+@[\w\.-]+(?:,\s*[\w\.-]+@[\w\.-]+)*",
+    },
+}
+
+
+class ValidatorRegistry:
+    def __init__(self, patterns):
+        """
+        Compiles validator patterns once, keyed by field type and country ISO-3 code.
+
+        :param patterns: Dict of field -> {country ISO code -> regex string}.
+        """
+        self.compiled = {}
+        # One alternation per field, so "valid for any country" is a single regex match
+        self.combined = {}
+        for field, countries in patterns.items():
+            for iso_code, pattern in countries.items():
+                self.register(field, iso_code, pattern)
+
+    def register(self, field, iso_code, pattern):
+        self.compiled.setdefault(field, {})[iso_code] = re.compile(pattern)
+        self.combined[field] = re.compile(
+            "|".join(f"(?:{compiled.pattern})" for compiled in self.compiled[field].values())
+        )
+
+    def pattern(self, field, iso_code=None):
+        """
+        Returns the compiled pattern for a field, for one country or for all of them.
+
+        :param field: The field type, e.g. "phone".
+        :param iso_code: Country ISO-3 code; None matches any registered country.
+        :return: A compiled pattern, or None if the country has no pattern for the field.
+        """
+        if iso_code is None:
+            return self.combined[field]
+        return self.compiled[field].get(iso_code)
+
+    def countries(self, field):
+        return dict(self.compiled[field])
+
+    def is_valid(self, field, value, iso_code=None):
+        pattern = self.pattern(field, iso_code)
+        return bool(pattern and pattern.match(value))
+
+    def match_series(self, field, values, iso_code=None):
+        """
+        Validates a whole column, matching the text of each value as is_valid(str(value)) would.
+        A categorical column is validated once per category.
+
+        :return: A boolean Series aligned with values.
+        """
+        pattern = self.pattern(field, iso_code)
+        if pattern is None:
+            return pd.Series(False, index=values.index)
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # One result per category, plus one for missing cells (code -1, so last), spread over the rows by code
+            categories = as_text(pd.Series(values.cat.categories))
+            valid = np.append(categories.str.match(pattern).to_numpy(dtype=bool), bool(pattern.match("nan")))
+            return pd.Series(valid[values.cat.codes.to_numpy()], index=values.index)
+        return as_text(values).str.match(pattern).astype(bool)
+
+
+validators = ValidatorRegistry(VALIDATOR_PATTERNS)